@@ -0,0 +1,240 @@
+"""
+Archive Service - move closed historical positions out of the hot table
+Archived rows go to one SQLite file per month; rollups stay in the main DB
+
+Usage:
+    python archive_service.py --older-than-days 30
+    python archive_service.py --older-than-days 30 --dry-run
+"""
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from data_service import DataService
+
+ARCHIVE_COLUMNS = "id, account_id, strategy_id, symbol, qty, entry_price, pnl, created_at, order_tag"
+
+class ArchiveService:
+    def __init__(self, data_service: DataService = None, archive_dir: str = "archive"):
+        self.data_service = data_service or DataService()
+        self.archive_dir = archive_dir
+
+    def archive_path(self, month: str) -> str:
+        """archive/positions_2026_09.db for month '2026-09'"""
+        return os.path.join(self.archive_dir, f"positions_{month.replace('-', '_')}.db")
+
+    def archive_positions(self, older_than_days: int = 30, dry_run: bool = False) -> dict:
+        """Move closed positions older than the cutoff into per-month archive databases
+
+        A position is closed when its account/strategy/symbol rows before the
+        cutoff net to zero quantity; anything still open stays in the hot table.
+        """
+        cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+        conn = self.data_service.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE archive_candidates AS
+            SELECT p.id, strftime('%Y-%m', p.created_at) AS month
+            FROM positions p
+            JOIN (
+                SELECT account_id, strategy_id, symbol FROM positions
+                WHERE created_at < ?
+                GROUP BY account_id, strategy_id, symbol
+                HAVING SUM(qty) = 0
+            ) closed
+              ON p.account_id = closed.account_id
+             AND p.strategy_id = closed.strategy_id
+             AND p.symbol = closed.symbol
+            WHERE p.created_at < ?
+        """, (cutoff, cutoff))
+        cursor.execute("SELECT month, COUNT(*) FROM archive_candidates GROUP BY month ORDER BY month")
+        months = cursor.fetchall()
+
+        result = {"cutoff": cutoff, "dry_run": dry_run, "months": {m: n for m, n in months},
+                  "archived": sum(n for _, n in months)}
+        if dry_run or not months:
+            conn.close()
+            return result
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        expected = dict(months)
+        for month, _ in months:
+            path = self.archive_path(month)
+            cursor.execute("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                self._ensure_archive_schema(cursor)
+
+                # Copy, roll up and delete in one transaction across both databases
+                cursor.execute("BEGIN")
+                cursor.execute(f"""
+                    INSERT INTO archive.positions ({ARCHIVE_COLUMNS})
+                    SELECT {ARCHIVE_COLUMNS} FROM main.positions
+                    WHERE id IN (SELECT id FROM archive_candidates WHERE month = ?)
+                """, (month,))
+                if cursor.rowcount != expected[month]:
+                    raise RuntimeError(f"archived {cursor.rowcount} of {expected[month]} positions for {month}")
+                cursor.execute("""
+                    INSERT INTO main.position_rollups (month, account_id, strategy_id, symbol, trades,
+                                                       net_qty, total_pnl, archive_path)
+                    SELECT ?, account_id, strategy_id, symbol, COUNT(*), SUM(qty), TOTAL(pnl), ?
+                    FROM main.positions
+                    WHERE id IN (SELECT id FROM archive_candidates WHERE month = ?)
+                    GROUP BY account_id, strategy_id, symbol
+                    ON CONFLICT (month, account_id, strategy_id, symbol) DO UPDATE SET
+                        trades = trades + excluded.trades,
+                        net_qty = net_qty + excluded.net_qty,
+                        total_pnl = total_pnl + excluded.total_pnl
+                """, (month, path, month))
+                # Totals cover archived history too: credit the rows back before the delete triggers take them out
+                cursor.execute("""
+                    INSERT INTO main.position_totals (account_id, strategy_id, total_positions, long_positions,
+                                                      short_positions, total_pnl)
+                    SELECT account_id, strategy_id, COUNT(*), TOTAL(qty > 0), TOTAL(qty < 0), TOTAL(pnl)
+                    FROM main.positions
+                    WHERE id IN (SELECT id FROM archive_candidates WHERE month = ?)
+                    GROUP BY account_id, strategy_id
+                    ON CONFLICT (account_id, strategy_id) DO UPDATE SET
+                        total_positions = total_positions + excluded.total_positions,
+                        long_positions = long_positions + excluded.long_positions,
+                        short_positions = short_positions + excluded.short_positions,
+                        total_pnl = total_pnl + excluded.total_pnl
+                """, (month,))
+                cursor.execute("""
+                    UPDATE main.position_stats SET
+                        total_positions = total_positions + (SELECT COUNT(*) FROM archive_candidates WHERE month = ?),
+                        total_pnl = total_pnl + (SELECT TOTAL(pnl) FROM main.positions
+                                                 WHERE id IN (SELECT id FROM archive_candidates WHERE month = ?))
+                    WHERE id = 1
+                """, (month, month))
+                cursor.execute("""
+                    DELETE FROM main.positions
+                    WHERE id IN (SELECT id FROM archive_candidates WHERE month = ?)
+                """, (month,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.execute("DETACH DATABASE archive")
+
+        conn.close()
+        return result
+
+    def _ensure_archive_schema(self, cursor):
+        """Create the attached archive's table and indexes if the file is new
+
+        Archive rows have their own key: position ids are reused once the hot
+        table's sequence is reset, so they cannot identify an archived row.
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archive.positions (
+                archive_id INTEGER PRIMARY KEY,
+                id INTEGER,
+                account_id INTEGER,
+                strategy_id INTEGER,
+                symbol TEXT,
+                qty INTEGER,
+                entry_price REAL,
+                pnl REAL DEFAULT 0,
+                created_at TIMESTAMP,
+                order_tag TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_account ON positions (account_id, archive_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_strategy ON positions (strategy_id, archive_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_symbol ON positions (symbol, archive_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_created ON positions (created_at)")
+        cursor.connection.commit()
+
+    def archived_months(self) -> List[str]:
+        """Months that have an archive file, newest first"""
+        months = []
+        for path in glob.glob(os.path.join(self.archive_dir, "positions_*.db")):
+            match = re.search(r"positions_(\d{4})_(\d{2})\.db$", path)
+            if match:
+                months.append(f"{match.group(1)}-{match.group(2)}")
+        return sorted(months, reverse=True)
+
+    def iter_history(self, chunk_size: int = 1000, account_id: Optional[int] = None,
+                     strategy_id: Optional[int] = None, symbol: Optional[str] = None,
+                     date_from: Optional[str] = None, date_to: Optional[str] = None) -> Iterator[dict]:
+        """Yield positions from the hot table, then from archives (newest month first)"""
+        filters = {"account_id": account_id, "strategy_id": strategy_id, "symbol": symbol,
+                   "date_from": date_from, "date_to": date_to}
+        yield from self.data_service.iter_positions(chunk_size=chunk_size, **filters)
+
+        months = [m for m in self.archived_months()
+                  if (not date_from or m >= date_from[:7]) and (not date_to or m <= date_to[:7])]
+        if not months:
+            return
+
+        account_names = {a.id: a.account_name for a in self.data_service.get_accounts()}
+        strategy_names = {s.id: s.name for s in self.data_service.get_strategies()}
+        for month in months:
+            conn = sqlite3.connect(self.archive_path(month))
+            cursor = None
+            try:
+                while True:
+                    where, params = self.data_service._position_filters(cursor=cursor, **filters)
+                    # Pages on archive_id: archived position ids are not unique
+                    rows = conn.execute(f"""
+                        SELECT p.id, p.position_id, p.account_id, p.strategy_id, p.symbol, p.qty, p.entry_price,
+                               p.pnl, p.created_at
+                        FROM (SELECT archive_id AS id, id AS position_id, account_id, strategy_id, symbol, qty,
+                                     entry_price, pnl, created_at FROM positions) p
+                        {where} ORDER BY p.id DESC LIMIT ?
+                    """, params + [chunk_size]).fetchall()
+                    for row in rows:
+                        yield self.data_service._row_to_position(
+                            row[1:] + (account_names.get(row[2], ""), strategy_names.get(row[3], "")))
+                    if len(rows) < chunk_size:
+                        break
+                    cursor = rows[-1][0]
+            finally:
+                conn.close()
+
+    def get_rollups(self, account_id: Optional[int] = None, strategy_id: Optional[int] = None) -> List[dict]:
+        """Monthly summaries of archived positions"""
+        clauses, params = [], []
+        if account_id is not None:
+            clauses.append("account_id = ?")
+            params.append(account_id)
+        if strategy_id is not None:
+            clauses.append("strategy_id = ?")
+            params.append(strategy_id)
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+
+        conn = self.data_service.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT month, account_id, strategy_id, symbol, trades, net_qty, total_pnl
+            FROM position_rollups {where}
+            ORDER BY month DESC, account_id, strategy_id, symbol
+        """, params)
+        rows = cursor.fetchall()
+        conn.close()
+        return [{
+            'month': row[0], 'account_id': row[1], 'strategy_id': row[2], 'symbol': row[3],
+            'trades': row[4], 'net_qty': row[5], 'total_pnl': row[6]
+        } for row in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed historical positions")
+    parser.add_argument("--older-than-days", type=int, default=30)
+    parser.add_argument("--archive-dir", default="archive")
+    parser.add_argument("--dry-run", action="store_true", help="report what would move without moving it")
+    args = parser.parse_args()
+
+    result = ArchiveService(archive_dir=args.archive_dir).archive_positions(args.older_than_days, args.dry_run)
+    action = "Would archive" if args.dry_run else "Archived"
+    print(f"{action} {result['archived']:,} positions created before {result['cutoff']}")
+    for month, count in result["months"].items():
+        print(f"  {month}: {count:,}")
+
+if __name__ == "__main__":
+    main()
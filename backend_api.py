@@ -1,10 +1,19 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from data_service import DataService
 from strategy_engine import StrategyEngine
 from execution_engine import ExecutionEngine
 from zerodha_service import ZerodhaService
 from models import Account, Strategy, AccountStrategy, Signal
+from event_log import event_log
+from profiler import profiler
+from signal_tickets import SignalTicketStore
+from session_manager import SessionManager
+from engine_state import EngineLease
+from quote_service import quote_service
+from engine_server import EngineClient, EngineError, EngineUnavailable, DEFAULT_ENGINE_URL
+from metrics import registry, ACTIVE_ACCOUNTS, SIGNAL_QUEUE_DEPTH, PROMETHEUS_CONTENT_TYPE
 import json
+import os
 import threading
 import time
 
@@ -14,44 +23,110 @@ class TradingSystemAPI:
         self.strategy_engine = StrategyEngine()
         self.execution_engine = ExecutionEngine(self.strategy_engine)
         self.running = False
+        self._state_lock = threading.Lock()
+        # Only the process holding this lease runs the engines, however many web workers exist
+        self.engine_lease = EngineLease(self.data_service.db, on_lost=self._on_lease_ended)
+        self.signal_tickets = SignalTicketStore()
+        self.session_manager = SessionManager(self.data_service, execution_engine=self.execution_engine)
+        # Control channel of the engine server holding the lease, when this process does not
+        self._holder = None
+        
+        SIGNAL_QUEUE_DEPTH.set_function(lambda: len(self.strategy_engine.signals))
+        ACTIVE_ACCOUNTS.set_function(lambda: self.data_service.get_status_summary()['active_accounts'])
     
     def start_system(self):
         """Start the complete trading system"""
-        if not self.running:
+        with self._state_lock:
+            if self.running:
+                return {"status": "error", "message": "System already running"}
+            if not self.engine_lease.acquire():
+                holder = self.engine_lease.status()
+                return {"status": "error", "message": f"System already running in {holder['owner']}"}
             self.strategy_engine.start()
             self.execution_engine.start()
             self.running = True
+            # Only the lease holder logs accounts in again, so workers never race each other's tokens
+            if os.getenv('SESSION_REFRESH_AT'):
+                self.session_manager.start_daily(os.getenv('SESSION_REFRESH_AT'))
             return {"status": "success", "message": "Trading system started"}
-        return {"status": "error", "message": "System already running"}
     
     def stop_system(self):
-        """Stop the complete trading system"""
-        if self.running:
-            self.strategy_engine.stop()
-            self.execution_engine.stop()
-            self.running = False
-            return {"status": "success", "message": "Trading system stopped"}
+        """Stop the complete trading system, or ask the process running it to stop"""
+        with self._state_lock:
+            if self.running:
+                self.session_manager.stop_daily()
+                self.strategy_engine.stop()
+                self.execution_engine.stop()
+                self.running = False
+                self.engine_lease.release()
+                return {"status": "success", "message": "Trading system stopped"}
+        if self.engine_lease.request_stop():
+            return {"status": "success", "message": "Stop requested from the process running the engines"}
         return {"status": "error", "message": "System not running"}
     
+    def _on_lease_ended(self, reason: str):
+        """Heartbeat callback: stop when asked to, or when another process may own the engines now"""
+        if reason == "stop_requested":
+            self.stop_system()
+            return
+        with self._state_lock:
+            if self.running:
+                self.session_manager.stop_daily()
+                self.strategy_engine.stop()
+                self.execution_engine.stop()
+                self.running = False
+        event_log.error("engine_lease_lost", owner=self.engine_lease.owner)
+    
+    def get_engine_state(self):
+        """Engine state shared by every process using this database"""
+        return self.engine_lease.status()
+    
+    def _on_holder(self, method: str, timeout: float = None, **kwargs):
+        """Run engine work in the process holding the lease, so only it sends orders and writes the journal"""
+        state = self.engine_lease.status()
+        if not state["running"]:
+            return {"status": "error", "message": "Trading system not running"}
+        if not state.get("url"):
+            return {"status": "error", "message": f"Trading engines run in {state['owner']}, which takes no "
+                                                  "engine calls; send signals there or run engine_server.py"}
+        holder = self._holder
+        if holder is None or holder.url != state["url"].rstrip("/"):
+            holder = self._holder = EngineClient(state["url"], os.getenv('ENGINE_TOKEN'))
+        try:
+            return holder.call(method, timeout=timeout, **kwargs)
+        except (EngineUnavailable, EngineError, RuntimeError, ValueError) as e:
+            return {"status": "error", "message": str(e)}
+    
+    def get_engine_status(self):
+        """Whether the engines run, and how much work is queued for them"""
+        return {"running": self.running, "signal_queue": len(self.strategy_engine.signals)}
+    
+    def get_margins(self):
+        return self.execution_engine.margin_cache.snapshots()
+    
+    def refresh_sessions(self, account_ids: list = None):
+        """Refresh broker sessions now; raises RuntimeError if a refresh is already running"""
+        return self.session_manager.refresh_all(account_ids or None)
+    
+    def profile_engines(self, seconds: float = 10, interval: float = 0.005):
+        """Collapsed stacks of the engine threads; raises RuntimeError if already profiling"""
+        return profiler.profile(seconds, interval)
+    
+    def get_logs(self, limit: int = 100, level: str = None):
+        return event_log.get_tail(limit, level)
+    
+    def get_status_summary(self):
+        """Get system status counts without loading accounts, strategies or positions"""
+        summary = self.data_service.get_status_summary()
+        summary["system_running"] = self.engine_lease.status()["running"]
+        return summary
+    
     def get_system_status(self):
         """Get overall system status"""
-        accounts = self.data_service.get_accounts()
-        strategies = self.data_service.get_strategies()
-        positions = self.data_service.get_positions()
-        
-        active_accounts = len([a for a in accounts if a.status == 'ACTIVE'])
-        active_strategies = len([s for s in strategies if s.is_active])
-        
-        return {
-            "system_running": self.running,
-            "total_accounts": len(accounts),
-            "active_accounts": active_accounts,
-            "total_strategies": len(strategies),
-            "active_strategies": active_strategies,
-            "total_positions": len(positions),
-            "accounts": [self._account_to_dict(a) for a in accounts],
-            "strategies": [self._strategy_to_dict(s) for s in strategies]
-        }
+        status = self.get_status_summary()
+        status["accounts"] = [self._account_to_dict(a) for a in self.data_service.get_accounts()]
+        status["strategies"] = [self._strategy_to_dict(s) for s in self.data_service.get_strategies()]
+        return status
     
     def create_account_with_zerodha(self, api_key: str, api_secret: str, capital: float, max_daily_loss: float):
         """Create account using Zerodha API integration"""
@@ -70,29 +145,28 @@ class TradingSystemAPI:
         """Complete account creation with request token"""
         return self.data_service.complete_account_setup(api_key, api_secret, request_token, capital, max_daily_loss)
     
-    def get_account_positions(self, account_id: int):
-        """Get positions for specific account"""
-        positions = self.data_service.get_positions()
-        account_positions = [p for p in positions if p['account_id'] == account_id]
-        return {"positions": account_positions}
+    def get_account_positions(self, account_id: int, limit: int = 100, cursor: int = None):
+        """Get a page of positions for specific account"""
+        return self.data_service.get_positions_page(limit=limit, cursor=cursor, account_id=account_id)
     
-    def get_strategy_performance(self, strategy_id: int):
-        """Get performance metrics for a strategy"""
-        positions = self.data_service.get_positions()
-        strategy_positions = [p for p in positions if p['strategy_id'] == strategy_id]
-        
-        total_pnl = sum(p['pnl'] for p in strategy_positions)
-        total_trades = len(strategy_positions)
+    def get_strategy_performance(self, strategy_id: int, limit: int = 100, cursor: int = None):
+        """Get performance metrics and a page of positions for a strategy"""
+        summary = self.data_service.get_positions_summary(strategy_id=strategy_id)
+        page = self.data_service.get_positions_page(limit=limit, cursor=cursor, strategy_id=strategy_id)
         
         return {
             "strategy_id": strategy_id,
-            "total_trades": total_trades,
-            "total_pnl": total_pnl,
-            "positions": strategy_positions
+            "total_trades": summary["total_positions"],
+            "total_pnl": summary["total_pnl"],
+            "positions": page["positions"],
+            "next_cursor": page["next_cursor"]
         }
     
     def manual_signal(self, strategy_id: int, symbol: str, action: str, price: float):
         """Manually trigger a trading signal"""
+        if not self.running:
+            return self._on_holder("manual_signal", strategy_id=strategy_id, symbol=symbol, action=action,
+                                   price=price)
         try:
             signal = Signal(
                 strategy_id=strategy_id,
@@ -102,23 +176,78 @@ class TradingSystemAPI:
                 timestamp=time.strftime('%Y-%m-%d %H:%M:%S')
             )
             
-            self.execution_engine.process_signal(signal)
-            return {"status": "success", "message": f"Signal processed: {action} {symbol}"}
+            legs = self.execution_engine.process_signal(signal)
+            return {"status": "success", "message": f"Signal processed: {action} {symbol}", "legs": legs}
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
+    def submit_signal(self, strategy_id: int, symbol: str, action: str, price: float):
+        """Queue a manual signal and return a ticket without waiting for the broker"""
+        if not self.running:
+            return self._on_holder("submit_signal", strategy_id=strategy_id, symbol=symbol, action=action,
+                                   price=price)
+        signal = Signal(
+            strategy_id=strategy_id,
+            symbol=symbol,
+            action=action,
+            price=price,
+            timestamp=time.strftime('%Y-%m-%d %H:%M:%S')
+        )
+        ticket = self.signal_tickets.submit(
+            lambda on_leg: self.execution_engine.process_signal(signal, on_leg=on_leg),
+            signal_id=signal.signal_id, strategy_id=strategy_id, symbol=symbol, action=action
+        )
+        return {"status": "accepted", "ticket": ticket}
+    
+    def submit_signal_batch(self, signals: list):
+        """Process a batch of signals together and return every leg's outcome"""
+        if not self.running:
+            return self._on_holder("submit_signal_batch", timeout=10 + 0.25 * len(signals), signals=signals)
+        try:
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+            batch = []
+            for data in signals:
+                if data['action'] not in ('BUY', 'SELL'):
+                    return {"status": "error", "message": f"Invalid action: {data['action']}"}
+                signal = Signal(
+                    strategy_id=int(data['strategy_id']),
+                    symbol=data['symbol'],
+                    action=data['action'],
+                    price=float(data['price']),
+                    timestamp=timestamp
+                )
+                # A client-supplied signal_id marks resends of the same signal within the batch
+                if data.get('signal_id'):
+                    signal.signal_id = str(data['signal_id'])
+                batch.append(signal)
+        except (KeyError, TypeError, ValueError) as e:
+            return {"status": "error", "message": f"Invalid signal: {e}"}
+        
+        # Outside the validation try: orders may already be out if this fails
+        legs = self.execution_engine.process_batch(batch)
+        summary = {}
+        for leg in legs:
+            summary[leg['status']] = summary.get(leg['status'], 0) + 1
+        return {"status": "success", "signals": len(batch), "summary": summary, "legs": legs}
+    
+    def get_signal_ticket(self, ticket_id: str, wait: float = 0, seen_legs: int = 0):
+        """Get per-leg results for a submitted signal, optionally long-polling for updates"""
+        ticket = self.signal_tickets.get(ticket_id, wait, seen_legs)
+        if ticket is None and not self.running:
+            # Tickets live in the process that ran the signal
+            return self._on_holder("get_signal_ticket", timeout=10 + wait, ticket_id=ticket_id, wait=wait,
+                                   seen_legs=seen_legs)
+        if ticket is None:
+            return {"status": "error", "message": "Ticket not found"}
+        return {"status": "success", "ticket": ticket}
+    
     def get_live_market_data(self, symbol: str):
-        """Get live market data for a symbol"""
-        # This would integrate with Zerodha API for real data
-        # For now, returning mock data
-        return {
-            "symbol": symbol,
-            "ltp": 2500.0,
-            "change": 25.0,
-            "change_percent": 1.0,
-            "volume": 1000000,
-            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        """Get live market data for a symbol from the shared quote cache"""
+        return quote_service.get_quote(symbol.upper())
+    
+    def get_live_market_data_batch(self, symbols):
+        """Quotes for many symbols in one broker call"""
+        return quote_service.get_quotes([s.upper() for s in symbols])
     
     def update_risk_parameters(self, account_id: int, max_daily_loss: float = None, capital: float = None):
         """Update risk parameters for an account"""
@@ -140,38 +269,47 @@ class TradingSystemAPI:
             return {"status": "error", "message": str(e)}
     
     def get_real_time_pnl(self):
-        """Get real-time P&L across all accounts"""
-        positions = self.data_service.get_positions()
-        accounts = self.data_service.get_accounts()
-        
+        """Get real-time P&L across all accounts from the trigger-maintained totals"""
         account_pnl = {}
-        for account in accounts:
-            account_positions = [p for p in positions if p['account_id'] == account.id]
-            total_pnl = sum(p['pnl'] for p in account_positions)
-            account_pnl[account.id] = {
-                "account_name": account.account_name,
-                "pnl": total_pnl,
-                "daily_loss": account.daily_loss,
-                "max_daily_loss": account.max_daily_loss,
-                "positions_count": len(account_positions)
+        for row in self.data_service.get_account_pnl():
+            account_pnl[row["account_id"]] = {
+                "account_name": row["account_name"],
+                "pnl": row["pnl"],
+                "daily_loss": row["daily_loss"],
+                "max_daily_loss": row["max_daily_loss"],
+                "positions_count": row["positions_count"]
             }
         
         return {"account_pnl": account_pnl}
     
     def emergency_stop(self):
-        """Emergency stop - close all positions and stop system"""
+        """Emergency stop - block new orders, stop the system and flatten every account in parallel"""
         try:
-            # Stop the system
+            started = time.perf_counter()
+            accounts = self.data_service.get_accounts()
+            # One statement, so no account can pass a risk check once this returns
+            deactivated = self.data_service.set_accounts_status('INACTIVE')
+            holder = self.engine_lease.status()
+            if not self.running and holder["running"] and holder.get("url"):
+                # Only the holder can wait out the orders its engines still have on the wire
+                result = self._on_holder("emergency_stop", timeout=120)
+                result.setdefault("accounts_deactivated", deactivated)
+                return result
             self.stop_system()
             
-            # In a real implementation, this would close all open positions
-            # For now, just mark all accounts as inactive
-            accounts = self.data_service.get_accounts()
-            for account in accounts:
-                account.status = 'INACTIVE'
-                self.data_service.update_account(account)
+            reports = self.execution_engine.flatten_accounts(accounts)
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            incomplete = [r["account_id"] for r in reports if r["status"] in ("PARTIAL", "FAILED")]
+            event_log.log("emergency_stop", accounts=len(reports), incomplete=len(incomplete), latency_ms=elapsed_ms)
             
-            return {"status": "success", "message": "Emergency stop executed"}
+            return {
+                "status": "error" if incomplete else "success",
+                "message": (f"Emergency stop executed; {len(incomplete)} account(s) not fully flattened"
+                            if incomplete else "Emergency stop executed; all accounts flattened"),
+                "accounts_deactivated": deactivated,
+                "elapsed_ms": elapsed_ms,
+                "accounts": reports
+            }
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
@@ -197,9 +335,90 @@ class TradingSystemAPI:
             "is_active": strategy.is_active
         }
 
+class RemoteTradingSystemAPI(TradingSystemAPI):
+    """TradingSystemAPI for a web process whose engines run in engine_server.py
+
+    Database reads and quotes are served locally; anything that touches the
+    engines is forwarded over the engine server's control channel.
+    """
+    def __init__(self, engine_url: str = DEFAULT_ENGINE_URL, token: str = None,
+                 batch_seconds_per_signal: float = 0.25):
+        self.data_service = DataService()
+        self.engine_lease = EngineLease(self.data_service.db)
+        self.engine = EngineClient(engine_url, token)
+        # A batch is answered once every leg is out, so its timeout grows with the batch
+        self.batch_seconds_per_signal = batch_seconds_per_signal
+    
+    @property
+    def running(self):
+        return self.get_engine_status()["running"]
+    
+    def _forward(self, method: str, timeout: float = None, **kwargs):
+        """Forward a call whose result is a status dict, reporting engine failures as error dicts too"""
+        try:
+            return self.engine.call(method, timeout=timeout, **kwargs)
+        except (EngineUnavailable, EngineError, RuntimeError, ValueError) as e:
+            return {"status": "error", "message": str(e)}
+    
+    def start_system(self):
+        return self._forward("start_system")
+    
+    def stop_system(self):
+        return self._forward("stop_system")
+    
+    def get_engine_status(self):
+        try:
+            return self.engine.call("get_engine_status")
+        except (EngineUnavailable, EngineError, RuntimeError, ValueError) as e:
+            return {"status": "error", "message": str(e), "running": False, "signal_queue": 0}
+    
+    def manual_signal(self, strategy_id: int, symbol: str, action: str, price: float):
+        return self._forward("manual_signal", strategy_id=strategy_id, symbol=symbol, action=action, price=price)
+    
+    def submit_signal(self, strategy_id: int, symbol: str, action: str, price: float):
+        return self._forward("submit_signal", strategy_id=strategy_id, symbol=symbol, action=action, price=price)
+    
+    def submit_signal_batch(self, signals: list):
+        return self._forward("submit_signal_batch",
+                             timeout=self.engine.timeout + self.batch_seconds_per_signal * len(signals),
+                             signals=signals)
+    
+    def get_signal_ticket(self, ticket_id: str, wait: float = 0, seen_legs: int = 0):
+        return self._forward("get_signal_ticket", timeout=self.engine.timeout + wait,
+                             ticket_id=ticket_id, wait=wait, seen_legs=seen_legs)
+    
+    def emergency_stop(self):
+        # Block new orders here first, so it holds even if the engine process cannot be reached
+        deactivated = self.data_service.set_accounts_status('INACTIVE')
+        result = self._forward("emergency_stop", timeout=120)
+        result.setdefault("accounts_deactivated", deactivated)
+        return result
+    
+    def get_margins(self):
+        return self.engine.call("get_margins")
+    
+    def refresh_sessions(self, account_ids: list = None):
+        return self.engine.call("refresh_sessions", timeout=300, account_ids=account_ids)
+    
+    def profile_engines(self, seconds: float = 10, interval: float = 0.005):
+        return self.engine.call("profile_engines", timeout=self.engine.timeout + seconds,
+                                seconds=seconds, interval=interval)
+    
+    def get_logs(self, limit: int = 100, level: str = None):
+        try:
+            return self.engine.call("get_logs", limit=limit, level=level)
+        except EngineUnavailable:
+            return event_log.get_tail(limit, level)
+
+def create_trading_api():
+    """In-process engines by default; ENGINE_MODE=remote controls engine_server.py at ENGINE_URL instead"""
+    if os.getenv('ENGINE_MODE', 'local') == 'remote':
+        return RemoteTradingSystemAPI(os.getenv('ENGINE_URL', DEFAULT_ENGINE_URL), os.getenv('ENGINE_TOKEN'))
+    return TradingSystemAPI()
+
 # Flask API endpoints
 app = Flask(__name__)
-trading_api = TradingSystemAPI()
+trading_api = create_trading_api()
 
 @app.route('/api/system/start', methods=['POST'])
 def start_system():
@@ -235,7 +454,9 @@ def complete_account_creation():
 
 @app.route('/api/accounts/<int:account_id>/positions', methods=['GET'])
 def get_account_positions(account_id):
-    return jsonify(trading_api.get_account_positions(account_id))
+    return jsonify(trading_api.get_account_positions(
+        account_id, max(1, min(request.args.get('limit', 100, type=int), 1000)), request.args.get('cursor', type=int)
+    ))
 
 @app.route('/api/accounts/<int:account_id>/risk', methods=['PUT'])
 def update_risk_parameters(account_id):
@@ -246,15 +467,41 @@ def update_risk_parameters(account_id):
 
 @app.route('/api/strategies/<int:strategy_id>/performance', methods=['GET'])
 def get_strategy_performance(strategy_id):
-    return jsonify(trading_api.get_strategy_performance(strategy_id))
+    return jsonify(trading_api.get_strategy_performance(
+        strategy_id, max(1, min(request.args.get('limit', 100, type=int), 1000)), request.args.get('cursor', type=int)
+    ))
 
 @app.route('/api/signals/manual', methods=['POST'])
 def manual_signal():
+    data = request.get_json(silent=True) or {}
+    try:
+        strategy_id, symbol, action, price = int(data['strategy_id']), data['symbol'], data['action'], float(data['price'])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid signal: {e}"}), 400
+    if action not in ('BUY', 'SELL'):
+        return jsonify({"status": "error", "message": f"Invalid action: {action}"}), 400
+    result = trading_api.submit_signal(strategy_id, symbol, action, price)
+    # A valid signal is only refused when no reachable process is running the engines
+    return jsonify(result), (202 if result['status'] == 'accepted' else 503)
+
+@app.route('/api/signals/batch', methods=['POST'])
+def batch_signals():
     data = request.json
-    return jsonify(trading_api.manual_signal(
-        data['strategy_id'], data['symbol'], 
-        data['action'], data['price']
-    ))
+    result = trading_api.submit_signal_batch(data.get('signals', []))
+    return jsonify(result), (400 if result['status'] == 'error' else 200)
+
+@app.route('/api/signals/tickets/<ticket_id>', methods=['GET'])
+def get_signal_ticket(ticket_id):
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    result = trading_api.get_signal_ticket(ticket_id, wait, request.args.get('seen_legs', 0, type=int))
+    return jsonify(result), (404 if result['status'] == 'error' else 200)
+
+@app.route('/api/market', methods=['GET'])
+def get_market_data_batch():
+    symbols = [s for s in request.args.get('symbols', '').split(',') if s.strip()]
+    if not symbols:
+        return jsonify({"status": "error", "message": "symbols query parameter is required"}), 400
+    return jsonify({"quotes": trading_api.get_live_market_data_batch(s.strip() for s in symbols)})
 
 @app.route('/api/market/<symbol>', methods=['GET'])
 def get_market_data(symbol):
@@ -264,5 +511,59 @@ def get_market_data(symbol):
 def get_realtime_pnl():
     return jsonify(trading_api.get_real_time_pnl())
 
+@app.route('/api/logs', methods=['GET'])
+def get_logs():
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({"events": trading_api.get_logs(limit, request.args.get('level'))})
+
+@app.route('/api/admin/profile', methods=['POST'])
+def profile_engines():
+    seconds = min(request.args.get('seconds', 10, type=float), 120)
+    interval = request.args.get('interval_ms', 5, type=float) / 1000
+    try:
+        collapsed = trading_api.profile_engines(seconds, interval)
+    except EngineUnavailable as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+    except RuntimeError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    return Response(collapsed, mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=engine-profile.collapsed'})
+
+@app.route('/api/margins', methods=['GET'])
+def get_margins():
+    try:
+        return jsonify({"margins": trading_api.get_margins()})
+    except EngineUnavailable as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+
+@app.route('/api/admin/sessions/refresh', methods=['POST'])
+def refresh_sessions():
+    account_ids = request.args.getlist('account_id', type=int)
+    try:
+        summary = trading_api.refresh_sessions(account_ids or None)
+    except EngineUnavailable as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+    except RuntimeError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    return jsonify(summary)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+def serve(host='127.0.0.1', port=5001):
+    """Serve the API on a multi-threaded production server when available"""
+    threads = int(os.getenv('BACKEND_THREADS', '64'))
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        event_log.log("waitress_unavailable", level="WARNING", fallback="flask_threaded")
+        app.run(host=host, port=port, threaded=True)
+        return
+    waitress_serve(app, host=host, port=port, threads=threads, connection_limit=max(1000, threads * 4))
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    if os.getenv('BACKEND_DEV') == '1':
+        app.run(debug=True, port=5001)
+    else:
+        serve()
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+Benchmark Harness for the Trading System
+Seeds a synthetic data set into a temporary database, times the hot paths
+and prints throughput / percentile latency as JSON
+
+Usage:
+    python benchmark.py --profile small
+    python benchmark.py --accounts 1000 --strategies 50 --positions 1000000 --output bench.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PROFILES = {
+    "small": {"accounts": 10, "strategies": 1, "positions": 10_000},
+    "medium": {"accounts": 500, "strategies": 50, "positions": 1_000_000},
+    "large": {"accounts": 5_000, "strategies": 500, "positions": 10_000_000},
+}
+
+SYMBOLS = ["RELIANCE", "TCS", "INFY", "HDFCBANK", "ICICIBANK", "SBIN", "ITC", "LT", "AXISBANK", "KOTAKBANK"]
+
+class FakeKite:
+    """Stands in for KiteConnect; optionally sleeps to mimic broker latency"""
+    _order_ids = itertools.count(1)
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def place_order(self, **params):
+        if self.latency:
+            time.sleep(self.latency)
+        return str(next(self._order_ids))
+
+def seed_database(db_path: str, accounts: int, strategies: int, positions: int, seed: int = 42):
+    """Populate a fresh database with synthetic accounts, strategies, mappings and positions"""
+    from models import Database
+
+    rng = random.Random(seed)
+    db = Database(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+
+    cursor.executemany("""
+        INSERT INTO accounts (broker, api_key, access_token, account_name, capital, max_daily_loss, status, daily_loss)
+        VALUES ('ZERODHA', ?, ?, ?, ?, ?, 'ACTIVE', 0)
+    """, ((f"key_{i}", f"token_{i}", f"Account {i}", 1_000_000.0, 50_000.0) for i in range(1, accounts + 1)))
+
+    cursor.executemany("""
+        INSERT INTO strategies (name, timeframe, parameters, is_active) VALUES (?, ?, ?, 1)
+    """, ((f"Strategy {i}", "5m", json.dumps({"buy_threshold": 2400, "sell_threshold": 2600,
+                                               "symbol": SYMBOLS[i % len(SYMBOLS)]}))
+          for i in range(1, strategies + 1)))
+
+    # Strategy 1 fans out to every account; each account also follows two other strategies
+    def mappings():
+        for account_id in range(1, accounts + 1):
+            yield (account_id, 1)
+            for k in range(1, 3):
+                strategy_id = 1 + (account_id + k) % strategies
+                if strategy_id != 1:
+                    yield (account_id, strategy_id)
+
+    cursor.executemany("""
+        INSERT INTO account_strategies (account_id, strategy_id, capital_allocation_percent, max_risk_per_trade, is_enabled)
+        VALUES (?, ?, 10, 2, 1)
+    """, mappings())
+    conn.commit()
+
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(positions, 1)
+
+    def position_rows():
+        for i in range(positions):
+            qty = rng.randint(1, 10) * rng.choice((1, -1))
+            yield (rng.randint(1, accounts), rng.randint(1, strategies), rng.choice(SYMBOLS), qty,
+                   round(rng.uniform(100, 4000), 2), round(rng.uniform(-500, 500), 2),
+                   (start + step * i).strftime('%Y-%m-%d %H:%M:%S'))
+
+    rows = position_rows()
+    while True:
+        chunk = list(itertools.islice(rows, 50_000))
+        if not chunk:
+            break
+        cursor.executemany("""
+            INSERT INTO positions (account_id, strategy_id, symbol, qty, entry_price, pnl, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, chunk)
+        conn.commit()
+    conn.close()
+
+def measure(name: str, func, iterations: int, max_seconds: float, ops_per_call: int = 1) -> dict:
+    """Call func repeatedly and summarise its latency distribution"""
+    func()  # warm-up
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - t0)
+        if time.perf_counter() > deadline:
+            break
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+
+    return {
+        "name": name,
+        "iterations": len(latencies),
+        "throughput_per_sec": round(len(latencies) * ops_per_call / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+def run_benchmarks(args) -> dict:
+    from event_log import event_log
+    from models import Signal
+    from strategy_engine import StrategyEngine
+    from execution_engine import ExecutionEngine
+    from data_service import DataService
+
+    event_log.echo = False
+
+    class FakeBrokerExecutionEngine(ExecutionEngine):
+        def get_kite_client(self, account):
+            return FakeKite(args.broker_latency_ms / 1000)
+
+    data_service = DataService()
+    engine = FakeBrokerExecutionEngine(StrategyEngine())
+    signal = Signal(strategy_id=1, symbol="RELIANCE", action="BUY", price=2500.0,
+                    timestamp=time.strftime('%Y-%m-%d %H:%M:%S'))
+
+    results = [
+        measure("execution.process_signal", lambda: engine.process_signal(signal),
+                args.iterations, args.max_seconds, ops_per_call=args.accounts),
+        measure("data_service.get_positions", data_service.get_positions,
+                args.iterations, args.max_seconds),
+        measure("data_service.get_position_columns", data_service.get_position_columns,
+                args.iterations, args.max_seconds),
+    ]
+
+    try:
+        import strategy_app
+    except ImportError as e:
+        print(f"Skipping Flask benchmarks: {e}", file=sys.stderr)
+        return {"results": results}
+
+    results.append(measure("api.get_real_time_pnl", strategy_app.trading_api.get_real_time_pnl,
+                           args.iterations, args.max_seconds))
+
+    client = strategy_app.app.test_client()
+    for route in ("/", "/positions", "/api/pnl"):
+        def get(route=route):
+            response = client.get(route)
+            assert response.status_code == 200, f"{route} returned {response.status_code}"
+        results.append(measure(f"flask GET {route}", get, args.iterations, args.max_seconds))
+    return {"results": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trading system hot paths")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--accounts", type=int)
+    parser.add_argument("--strategies", type=int)
+    parser.add_argument("--positions", type=int)
+    parser.add_argument("--iterations", type=int, default=200, help="max iterations per benchmark")
+    parser.add_argument("--max-seconds", type=float, default=20.0, help="time budget per benchmark")
+    parser.add_argument("--broker-latency-ms", type=float, default=0.0, help="simulated place_order latency")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--keep-db", action="store_true", help="keep the temporary database directory")
+    args = parser.parse_args()
+
+    sizes = dict(PROFILES[args.profile])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+    args.accounts = sizes["accounts"]
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, repo_dir)
+    workdir = tempfile.mkdtemp(prefix="trading-bench-")
+    cwd = os.getcwd()
+    try:
+        # Everything opens trading.db relative to the working directory
+        os.chdir(workdir)
+        seed_started = time.perf_counter()
+        seed_database("trading.db", sizes["accounts"], sizes["strategies"], sizes["positions"], args.seed)
+        seed_seconds = time.perf_counter() - seed_started
+
+        report = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "dataset": sizes,
+            "seed_seconds": round(seed_seconds, 2),
+            "broker_latency_ms": args.broker_latency_ms,
+        }
+        report.update(run_benchmarks(args))
+    finally:
+        os.chdir(cwd)
+        if args.keep_db:
+            print(f"Database kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
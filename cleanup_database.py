@@ -16,6 +16,11 @@ def cleanup_database():
     print("Removing positions...")
     cursor.execute("DELETE FROM positions")
     
+    print("Removing archived position rollups...")
+    cursor.execute("DELETE FROM position_rollups")
+    cursor.execute("DELETE FROM position_totals")
+    cursor.execute("UPDATE position_stats SET total_positions = 0, total_pnl = 0")
+    
     print("Removing account-strategy mappings...")
     cursor.execute("DELETE FROM account_strategies")
     
@@ -34,6 +39,7 @@ def cleanup_database():
     print("\n[SUCCESS] Database cleaned up!")
     print("All accounts, strategies, mappings, and positions have been removed.")
     print("You now have a fresh, empty database.")
+    print("Monthly archive files under archive/ are left untouched.")
 
 if __name__ == "__main__":
     cleanup_database()
\ No newline at end of file
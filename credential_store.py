@@ -0,0 +1,80 @@
+"""
+Credential Store - encrypts broker login secrets before they reach the database
+API secrets, passwords and TOTP seeds are sealed with a Fernet key taken from
+CREDENTIALS_KEY. Without a key nothing is stored; rows written before encryption
+was added are still readable and are re-sealed the next time they are read.
+
+Usage:
+    python credential_store.py --generate-key
+"""
+
+import argparse
+import os
+from typing import Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # Stored credentials are optional; without them sessions are refreshed by hand
+    Fernet = None
+    InvalidToken = ValueError
+
+# Marks a sealed value, so plaintext rows from before encryption can be told apart
+PREFIX = "enc:v1:"
+
+class CredentialCipher:
+    def __init__(self, key: Optional[str] = None):
+        self._fernet = None
+        self.error = None
+        if not key:
+            self.error = "CREDENTIALS_KEY is not set"
+        elif Fernet is None:
+            self.error = "Credential encryption requires cryptography: pip install cryptography"
+        else:
+            try:
+                self._fernet = Fernet(key.encode())
+            except ValueError as e:
+                self.error = f"CREDENTIALS_KEY is not a valid Fernet key: {e}"
+
+    @property
+    def available(self) -> bool:
+        return self._fernet is not None
+
+    @staticmethod
+    def is_sealed(value: Optional[str]) -> bool:
+        return bool(value) and value.startswith(PREFIX)
+
+    def seal(self, value: Optional[str]) -> Optional[str]:
+        """Encrypt one secret; raises RuntimeError when no key is configured"""
+        if not self.available:
+            raise RuntimeError(self.error)
+        if value is None or self.is_sealed(value):
+            return value
+        return PREFIX + self._fernet.encrypt(value.encode()).decode()
+
+    def open(self, value: Optional[str]) -> Optional[str]:
+        """Decrypt one secret; legacy plaintext is returned unchanged"""
+        if not self.is_sealed(value):
+            return value
+        if not self.available:
+            raise RuntimeError(self.error)
+        try:
+            return self._fernet.decrypt(value[len(PREFIX):].encode()).decode()
+        except InvalidToken:
+            raise RuntimeError("Stored credentials were sealed with a different CREDENTIALS_KEY")
+
+credential_cipher = CredentialCipher(os.getenv("CREDENTIALS_KEY"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the key that encrypts stored broker credentials")
+    parser.add_argument("--generate-key", action="store_true", help="print a new CREDENTIALS_KEY")
+    args = parser.parse_args()
+
+    if args.generate_key:
+        if Fernet is None:
+            raise SystemExit("Credential encryption requires cryptography: pip install cryptography")
+        print(Fernet.generate_key().decode())
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
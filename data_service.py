@@ -1,5 +1,8 @@
-from models import Database, Account, Strategy, AccountStrategy, Position
+from models import Database, Account, Strategy, AccountStrategy, Position, PositionColumns
 from zerodha_service import ZerodhaService
+from credential_store import credential_cipher
+from event_log import event_log
+from metrics import DB_QUERY_SECONDS
 from typing import List, Optional
 
 class DataService:
@@ -48,6 +51,46 @@ class DataService:
             accounts.append(account)
         return accounts
     
+    def get_status_summary(self) -> dict:
+        """Counts for the status bar in a single query, without loading any rows"""
+        with DB_QUERY_SECONDS.time(query="get_status_summary"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT
+                    (SELECT COUNT(*) FROM accounts),
+                    (SELECT TOTAL(status = 'ACTIVE') FROM accounts),
+                    (SELECT COUNT(*) FROM strategies),
+                    (SELECT TOTAL(is_active) FROM strategies),
+                    total_positions,
+                    total_pnl
+                FROM position_stats WHERE id = 1
+            """)
+            row = cursor.fetchone()
+            conn.close()
+        
+        return {
+            'total_accounts': row[0],
+            'active_accounts': int(row[1]),
+            'total_strategies': row[2],
+            'active_strategies': int(row[3]),
+            'total_positions': row[4],
+            'total_pnl': row[5]
+        }
+    
+    def set_accounts_status(self, status: str, account_ids: Optional[List[int]] = None) -> int:
+        """Set the status of all (or the given) accounts in one statement; returns rows changed"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        if account_ids is None:
+            cursor.execute("UPDATE accounts SET status = ?", (status,))
+        else:
+            cursor.execute(f"UPDATE accounts SET status = ? WHERE id IN ({','.join('?' * len(account_ids))})",
+                           (status, *account_ids))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount
+    
     def update_account(self, account: Account):
         conn = self.db.get_connection()
         cursor = conn.cursor()
@@ -138,11 +181,19 @@ class DataService:
                             status='ACTIVE'
                         )
                         account_id = self.create_account(account)
-                        return {
+                        result = {
                             'success': True,
                             'account_id': account_id,
                             'account_name': account.account_name
                         }
+                        try:
+                            self.save_account_credentials(account_id, api_secret, user_id, password, totp_secret)
+                        except RuntimeError as e:
+                            # The account works today; it just cannot be logged in again automatically
+                            event_log.log("credentials_not_stored", level="WARNING", account_id=account_id,
+                                          error=str(e))
+                            result['warning'] = f"Credentials not stored for daily refresh: {e}"
+                        return result
             
             return login_result
             
@@ -152,9 +203,69 @@ class DataService:
                 'error': str(e)
             }
     
+    def save_account_credentials(self, account_id: int, api_secret: str, user_id: str, password: str,
+                                 totp_secret: str = None):
+        """Store login credentials encrypted; raises RuntimeError when CREDENTIALS_KEY is not usable"""
+        api_secret, password, totp_secret = (credential_cipher.seal(value)
+                                             for value in (api_secret, password, totp_secret))
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO account_credentials (account_id, api_secret, user_id, password, totp_secret)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (account_id) DO UPDATE SET
+                api_secret = excluded.api_secret, user_id = excluded.user_id,
+                password = excluded.password, totp_secret = excluded.totp_secret
+        """, (account_id, api_secret, user_id, password, totp_secret))
+        conn.commit()
+        conn.close()
+    
+    def get_account_credentials(self, account_ids: Optional[List[int]] = None) -> List[dict]:
+        """Accounts that have stored login credentials, decrypted, with their current API key"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        query = """
+            SELECT a.id, a.api_key, a.account_name, c.api_secret, c.user_id, c.password, c.totp_secret
+            FROM account_credentials c
+            JOIN accounts a ON a.id = c.account_id
+        """
+        params = []
+        if account_ids:
+            query += f" WHERE a.id IN ({','.join('?' * len(account_ids))})"
+            params = list(account_ids)
+        cursor.execute(query + " ORDER BY a.id", params)
+        rows = cursor.fetchall()
+
+        # Rows stored before encryption was added are sealed as soon as a key is available
+        legacy = [row for row in rows
+                  if any(value and not credential_cipher.is_sealed(value) for value in (row[3], row[5], row[6]))]
+        if legacy and credential_cipher.available:
+            cursor.executemany(
+                "UPDATE account_credentials SET api_secret=?, password=?, totp_secret=? WHERE account_id=?",
+                [(credential_cipher.seal(row[3]), credential_cipher.seal(row[5]), credential_cipher.seal(row[6]),
+                  row[0]) for row in legacy])
+            conn.commit()
+            event_log.log("credentials_encrypted", accounts=len(legacy))
+        conn.close()
+        return [{
+            'account_id': row[0], 'api_key': row[1], 'account_name': row[2],
+            'api_secret': credential_cipher.open(row[3]), 'user_id': row[4],
+            'password': credential_cipher.open(row[5]), 'totp_secret': credential_cipher.open(row[6])
+        } for row in rows]
+    
+    def update_access_token(self, account_id: int, access_token: str):
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE accounts SET access_token=? WHERE id=?", (access_token, account_id))
+        cursor.execute("UPDATE account_credentials SET token_refreshed_at=CURRENT_TIMESTAMP WHERE account_id=?",
+                       (account_id,))
+        conn.commit()
+        conn.close()
+    
     def delete_account(self, account_id: int):
         conn = self.db.get_connection()
         cursor = conn.cursor()
+        cursor.execute("DELETE FROM account_credentials WHERE account_id=?", (account_id,))
         cursor.execute("DELETE FROM accounts WHERE id=?", (account_id,))
         conn.commit()
         conn.close()
@@ -265,31 +376,242 @@ class DataService:
     
     # Position operations
     def get_positions(self) -> List[dict]:
+        with DB_QUERY_SECONDS.time(query="get_positions"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT p.id, p.account_id, p.strategy_id, p.symbol, p.qty, p.entry_price, p.pnl,
+                       p.created_at, a.account_name, s.name as strategy_name
+                FROM positions p
+                JOIN accounts a ON p.account_id = a.id
+                JOIN strategies s ON p.strategy_id = s.id
+                ORDER BY p.created_at DESC
+            """)
+            rows = cursor.fetchall()
+            conn.close()
+        
+        return [self._row_to_position(row) for row in rows]
+    
+    def get_positions_page(self, limit: int = 50, cursor: Optional[int] = None, **filters) -> dict:
+        """One page of positions, newest first; pass next_cursor back to get the next page"""
+        where, params = self._position_filters(cursor=cursor, **filters)
+        with DB_QUERY_SECONDS.time(query="get_positions_page"):
+            conn = self.db.get_connection()
+            db_cursor = conn.cursor()
+            db_cursor.execute(f"""
+                SELECT p.id, p.account_id, p.strategy_id, p.symbol, p.qty, p.entry_price, p.pnl,
+                       p.created_at, a.account_name, s.name as strategy_name
+                FROM positions p
+                JOIN accounts a ON p.account_id = a.id
+                JOIN strategies s ON p.strategy_id = s.id
+                {where}
+                ORDER BY p.id DESC
+                LIMIT ?
+            """, params + [limit + 1])
+            rows = db_cursor.fetchall()
+            conn.close()
+        
+        positions = [self._row_to_position(row) for row in rows[:limit]]
+        next_cursor = positions[-1]['id'] if len(rows) > limit else None
+        return {'positions': positions, 'next_cursor': next_cursor}
+    
+    def iter_positions(self, chunk_size: int = 1000, **filters):
+        """Yield every matching position, newest first, reading chunk_size rows at a time"""
+        cursor = None
+        while True:
+            page = self.get_positions_page(limit=chunk_size, cursor=cursor, **filters)
+            yield from page['positions']
+            cursor = page['next_cursor']
+            if cursor is None:
+                return
+    
+    def get_position_columns(self, chunk_size: int = 10000, **filters) -> PositionColumns:
+        """All matching positions as typed columns, without a dict or object per row"""
+        return self._position_columns(chunk_size, None, **filters)
+    
+    def get_position_columns_page(self, limit: int = 1000, cursor: Optional[int] = None, **filters) -> dict:
+        """One page of positions as typed columns, newest first; pass next_cursor back for the next page"""
+        columns = self._position_columns(limit + 1, limit + 1, cursor=cursor, **filters)
+        next_cursor = None
+        if len(columns) > limit:
+            columns.truncate(limit)
+            next_cursor = columns.id[-1]
+        return {'columns': columns, 'next_cursor': next_cursor}
+    
+    def _position_columns(self, chunk_size: int, limit: Optional[int], **filters) -> PositionColumns:
+        where, params = self._position_filters(**filters)
+        columns = PositionColumns()
+        with DB_QUERY_SECONDS.time(query="get_position_columns"):
+            conn = self.db.get_connection()
+            db_cursor = conn.cursor()
+            db_cursor.execute(f"""
+                SELECT p.id, p.account_id, p.strategy_id, p.symbol, p.qty, p.entry_price, p.pnl, p.created_at
+                FROM positions p {where}
+                ORDER BY p.id DESC
+                {'LIMIT ?' if limit is not None else ''}
+            """, params + ([limit] if limit is not None else []))
+            while True:
+                rows = db_cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                columns.extend(rows)
+            conn.close()
+        return columns
+    
+    def get_positions_summary(self, account_id: Optional[int] = None, strategy_id: Optional[int] = None,
+                              symbol: Optional[str] = None, date_from: Optional[str] = None,
+                              date_to: Optional[str] = None) -> dict:
+        """Counts and P&L grouped by strategy and account for the matching positions"""
+        if symbol or date_from or date_to:
+            # Ad-hoc filters have to aggregate the matching rows themselves
+            where, params = self._position_filters(account_id=account_id, strategy_id=strategy_id,
+                                                   symbol=symbol, date_from=date_from, date_to=date_to)
+            source = f"""
+                (SELECT p.account_id, p.strategy_id, COUNT(*) AS total_positions,
+                        TOTAL(p.qty > 0) AS long_positions, TOTAL(p.qty < 0) AS short_positions,
+                        TOTAL(p.pnl) AS total_pnl
+                 FROM positions p {where} GROUP BY p.account_id, p.strategy_id)
+            """
+            where, params_outer = "", []
+        else:
+            source = "position_totals"
+            clauses, params_outer = [], []
+            if account_id is not None:
+                clauses.append("t.account_id = ?")
+                params_outer.append(account_id)
+            if strategy_id is not None:
+                clauses.append("t.strategy_id = ?")
+                params_outer.append(strategy_id)
+            where = "WHERE " + " AND ".join(clauses) if clauses else ""
+            params = []
+        
+        with DB_QUERY_SECONDS.time(query="get_positions_summary"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT t.account_id, a.account_name, t.strategy_id, s.name, t.total_positions,
+                       t.long_positions, t.short_positions, t.total_pnl
+                FROM {source} t
+                JOIN accounts a ON t.account_id = a.id
+                JOIN strategies s ON t.strategy_id = s.id
+                {where}
+            """, params + params_outer)
+            rows = cursor.fetchall()
+            conn.close()
+        
+        summary = {'total_positions': 0, 'long_positions': 0, 'short_positions': 0, 'total_pnl': 0.0,
+                   'by_strategy': {}, 'by_account': {}}
+        for acc_id, account_name, strat_id, strategy_name, total, longs, shorts, pnl in rows:
+            if not total:
+                continue
+            summary['total_positions'] += total
+            summary['long_positions'] += int(longs)
+            summary['short_positions'] += int(shorts)
+            summary['total_pnl'] += pnl
+            for key, name in (('by_strategy', strategy_name or ""), ('by_account', account_name or "")):
+                group = summary[key].setdefault(name, {'positions': 0, 'pnl': 0.0})
+                group['positions'] += total
+                group['pnl'] += pnl
+        return summary
+    
+    def get_pnl_report(self, account_id: Optional[int] = None, strategy_id: Optional[int] = None) -> List[dict]:
+        """P&L and position counts per account/strategy pair"""
+        clauses, params = [], []
+        if account_id is not None:
+            clauses.append("t.account_id = ?")
+            params.append(account_id)
+        if strategy_id is not None:
+            clauses.append("t.strategy_id = ?")
+            params.append(strategy_id)
+        where = "WHERE " + " AND ".join(clauses) if clauses else ""
+        
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT t.account_id, a.account_name, t.strategy_id, s.name, t.total_positions,
+                   t.long_positions, t.short_positions, t.total_pnl, a.daily_loss, a.max_daily_loss
+            FROM position_totals t
+            JOIN accounts a ON t.account_id = a.id
+            JOIN strategies s ON t.strategy_id = s.id
+            {where}
+            ORDER BY t.account_id, t.strategy_id
+        """, params)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [{
+            'account_id': row[0],
+            'account_name': row[1] or "",
+            'strategy_id': row[2],
+            'strategy_name': row[3] or "",
+            'total_positions': row[4],
+            'long_positions': row[5],
+            'short_positions': row[6],
+            'total_pnl': float(row[7] or 0),
+            'daily_loss': float(row[8] or 0),
+            'max_daily_loss': float(row[9] or 0)
+        } for row in rows]
+    
+    def get_account_pnl(self) -> List[dict]:
+        """P&L and position count per account from position_totals, archived positions included"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT p.*, a.account_name, s.name as strategy_name
-            FROM positions p
-            JOIN accounts a ON p.account_id = a.id
-            JOIN strategies s ON p.strategy_id = s.id
-            ORDER BY p.created_at DESC
+            SELECT a.id, a.account_name, a.daily_loss, a.max_daily_loss,
+                   COALESCE(SUM(t.total_pnl), 0), COALESCE(SUM(t.total_positions), 0)
+            FROM accounts a
+            LEFT JOIN position_totals t ON t.account_id = a.id
+            GROUP BY a.id
+            ORDER BY a.id
         """)
         rows = cursor.fetchall()
         conn.close()
         
-        positions = []
-        for row in rows:
-            position = {
-                'id': row[0],
-                'account_id': row[1],
-                'strategy_id': row[2],
-                'symbol': row[3] or "",
-                'qty': int(row[4] or 0),
-                'entry_price': float(row[5] or 0),
-                'pnl': float(row[6] or 0),
-                'created_at': row[7] or "",
-                'account_name': row[8] or "",
-                'strategy_name': row[9] or ""
-            }
-            positions.append(position)
-        return positions
\ No newline at end of file
+        return [{
+            'account_id': row[0],
+            'account_name': row[1] or "",
+            'daily_loss': float(row[2] or 0),
+            'max_daily_loss': float(row[3] or 0),
+            'pnl': float(row[4]),
+            'positions_count': row[5]
+        } for row in rows]
+    
+    def _position_filters(self, cursor: Optional[int] = None, account_id: Optional[int] = None,
+                          strategy_id: Optional[int] = None, symbol: Optional[str] = None,
+                          date_from: Optional[str] = None, date_to: Optional[str] = None):
+        """Build the WHERE clause shared by the paginated position queries"""
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("p.id < ?")
+            params.append(cursor)
+        if account_id is not None:
+            clauses.append("p.account_id = ?")
+            params.append(account_id)
+        if strategy_id is not None:
+            clauses.append("p.strategy_id = ?")
+            params.append(strategy_id)
+        if symbol:
+            clauses.append("p.symbol = ?")
+            params.append(symbol.upper())
+        if date_from:
+            clauses.append("p.created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            # Date-only upper bounds include the whole day
+            clauses.append("p.created_at < date(?, '+1 day')" if len(date_to) == 10 else "p.created_at <= ?")
+            params.append(date_to)
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+    
+    def _row_to_position(self, row) -> dict:
+        return {
+            'id': row[0],
+            'account_id': row[1],
+            'strategy_id': row[2],
+            'symbol': row[3] or "",
+            'qty': int(row[4] or 0),
+            'entry_price': float(row[5] or 0),
+            'pnl': float(row[6] or 0),
+            'created_at': row[7] or "",
+            'account_name': row[8] or "",
+            'strategy_name': row[9] or ""
+        }
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+Engine Server - runs the strategy and execution engines in their own process
+The web apps control it over a small JSON-over-HTTP channel on localhost, so page
+rendering and API traffic never share a GIL with order execution
+
+Usage:
+    python engine_server.py --start
+    ENGINE_MODE=remote python run_strategy_system.py
+"""
+
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+from metrics import registry, PROMETHEUS_CONTENT_TYPE
+
+# TradingSystemAPI methods the web tier may call on the engine process
+ENGINE_METHODS = frozenset({
+    "start_system", "stop_system", "get_engine_status", "manual_signal", "submit_signal",
+    "submit_signal_batch", "get_signal_ticket", "emergency_stop", "get_margins",
+    "refresh_sessions", "profile_engines", "get_logs"
+})
+
+DEFAULT_ENGINE_URL = "http://127.0.0.1:5002"
+
+class EngineUnavailable(ConnectionError):
+    """The engine server could not be reached"""
+
+class EngineTimeout(EngineUnavailable):
+    """The engine server took the call but did not answer in time; it may still complete"""
+
+class EngineError(Exception):
+    """The engine server failed while running the call"""
+
+class EngineClient:
+    """Calls TradingSystemAPI methods in the engine process over its control channel"""
+
+    def __init__(self, url: str = DEFAULT_ENGINE_URL, token: str = None, timeout: float = 10.0):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        # One keep-alive session shared by every web worker thread
+        self.session = requests.Session()
+        if token:
+            self.session.headers["X-Engine-Token"] = token
+
+    def call(self, method: str, timeout: float = None, **kwargs):
+        """Run `method(**kwargs)` in the engine process and return its result
+
+        RuntimeError and ValueError raised there are raised here too; EngineError
+        means it failed otherwise, EngineUnavailable that the server did not answer.
+        """
+        try:
+            response = self.session.post(f"{self.url}/rpc/{method}", json=kwargs,
+                                         timeout=timeout or self.timeout)
+        except requests.ReadTimeout as e:
+            raise EngineTimeout(f"Engine server at {self.url} did not answer {method} within "
+                                f"{timeout or self.timeout}s; it may still complete") from e
+        except requests.RequestException as e:
+            raise EngineUnavailable(f"Engine server unavailable at {self.url}: {e}") from e
+        try:
+            body = response.json()
+        except ValueError:
+            raise EngineError(f"Engine server returned a non-JSON {response.status_code} response to {method}")
+        if response.status_code == 200:
+            return body["result"]
+        if response.status_code == 409:
+            raise RuntimeError(body["error"])
+        if response.status_code == 400:
+            raise ValueError(body["error"])
+        raise EngineError(f"Engine server error {response.status_code} in {method}: {body.get('error')}")
+
+    def health(self) -> dict:
+        try:
+            return self.session.get(f"{self.url}/health", timeout=self.timeout).json()
+        except (requests.RequestException, ValueError) as e:
+            raise EngineUnavailable(f"Engine server unavailable at {self.url}: {e}") from e
+
+class EngineRequestHandler(BaseHTTPRequestHandler):
+    server_version = "EngineServer/1.0"
+    # Keep-alive, so the web tier's session reuses one connection per thread
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            status = self.server.trading_api.get_engine_status()
+            self._send(200, dict(status, status="ok", pid=os.getpid()))
+        elif path == "/metrics":
+            self._send_text(200, registry.render(), PROMETHEUS_CONTENT_TYPE)
+        else:
+            self._send(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.server.token and not hmac.compare_digest(self.headers.get("X-Engine-Token", "").encode(),
+                                                         self.server.token.encode()):
+            self._send(403, {"error": "Invalid engine token"})
+            return
+        if not path.startswith("/rpc/") or path[len("/rpc/"):] not in ENGINE_METHODS:
+            self._send(404, {"error": f"Unknown method {path}"})
+            return
+        try:
+            kwargs = json.loads(raw or b"{}")
+            result = getattr(self.server.trading_api, path[len("/rpc/"):])(**kwargs)
+        except RuntimeError as e:
+            self._send(409, {"error": str(e)})
+        except (TypeError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": str(e)})
+        else:
+            self._send(200, {"result": result})
+
+    def _send(self, status: int, body: dict):
+        self._send_text(status, json.dumps(body, default=str), "application/json")
+
+    def _send_text(self, status: int, text: str, content_type: str):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Control traffic is not worth a line per request
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+class EngineServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, trading_api, host: str = "127.0.0.1", port: int = 5002, token: str = None):
+        # Anyone who can reach the port could send orders, so only loopback may go without a token
+        if not token and not is_loopback(host):
+            raise ValueError(f"Set ENGINE_TOKEN to listen on {host!r}; without it only loopback is allowed")
+        super().__init__((host, port), EngineRequestHandler)
+        self.trading_api = trading_api
+        self.token = token
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the trading engines in their own process")
+    parser.add_argument("--host", default=os.getenv("ENGINE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ENGINE_PORT", "5002")))
+    parser.add_argument("--start", action="store_true", help="start the engines immediately")
+    args = parser.parse_args()
+
+    # This process hosts the engines, whatever the web tier is configured for
+    os.environ["ENGINE_MODE"] = "local"
+    from backend_api import trading_api
+    from event_log import event_log
+
+    try:
+        server = EngineServer(trading_api, args.host, args.port, os.getenv("ENGINE_TOKEN"))
+    except ValueError as e:
+        parser.error(str(e))
+    # Advertised with the lease, so web workers in local mode hand their signals to this process
+    trading_api.engine_lease.url = os.getenv("ENGINE_URL") or \
+        f"http://{'127.0.0.1' if args.host in ('', '0.0.0.0') else args.host}:{server.server_address[1]}"
+
+    def shutdown(signum, frame):
+        # shutdown() blocks until serve_forever returns, so it cannot run on the serving thread
+        threading.Thread(target=server.shutdown, name="EngineServer-shutdown").start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    if args.start:
+        print(trading_api.start_system()["message"])
+    event_log.log("engine_server_started", host=args.host, port=args.port, pid=os.getpid())
+    print(f"[OK] Engine server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if trading_api.running:
+            trading_api.stop_system()
+        event_log.log("engine_server_stopped")
+        event_log.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Engine state - which process runs the trading engines, shared through SQLite
+A process must hold the engine lease to run the engines and renews it with a
+heartbeat. Every web worker reads the same row, so status agrees across workers
+and a second start anywhere is refused until the lease is released or lapses.
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from event_log import event_log
+from models import Database
+
+class EngineLease:
+    def __init__(self, db: Database = None, name: str = "trading", ttl: float = 15.0, heartbeat: float = 5.0,
+                 on_lost: Optional[Callable[[str], None]] = None, url: Optional[str] = None):
+        self.db = db or Database()
+        self.name = name
+        # A holder that misses heartbeats for this long loses the lease to the next start
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        # Called from the heartbeat thread with "lost" or "stop_requested"
+        self.on_lost = on_lost
+        # Where this process takes engine calls (engine_server.py), advertised while it holds the lease
+        self.url = url
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+        # Replaced on every acquire, so a release always stops the heartbeat that acquire started
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self) -> bool:
+        """Take the lease if it is free, expired or already ours, and start heartbeating"""
+        now = time.time()
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute("""
+                INSERT INTO engine_state (name, owner, host, pid, running, stop_requested,
+                                          started_at, heartbeat_at, lease_expires, url)
+                VALUES (?, ?, ?, ?, 1, 0, ?, ?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    owner = excluded.owner, host = excluded.host, pid = excluded.pid, running = 1,
+                    stop_requested = 0, started_at = excluded.started_at,
+                    heartbeat_at = excluded.heartbeat_at, lease_expires = excluded.lease_expires,
+                    url = excluded.url
+                WHERE engine_state.owner = excluded.owner OR engine_state.running = 0
+                   OR engine_state.lease_expires < excluded.heartbeat_at
+            """, (self.name, self.owner, socket.gethostname(), os.getpid(), now, now, now + self.ttl, self.url))
+            conn.commit()
+            acquired = cursor.rowcount == 1
+        finally:
+            conn.close()
+
+        if acquired:
+            self.held = True
+            self._stop.set()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run_heartbeat, args=(self._stop,),
+                                            name="EngineLease-heartbeat")
+            self._thread.daemon = True
+            self._thread.start()
+            event_log.log("engine_lease_acquired", name=self.name, owner=self.owner)
+        return acquired
+
+    def release(self):
+        """Give the lease up and mark the engines stopped"""
+        self._stop.set()
+        self.held = False
+        conn = self.db.get_connection()
+        try:
+            conn.execute("""
+                UPDATE engine_state SET running = 0, stop_requested = 0, heartbeat_at = ?, lease_expires = 0
+                WHERE name = ? AND owner = ?
+            """, (time.time(), self.name, self.owner))
+            conn.commit()
+        finally:
+            conn.close()
+        event_log.log("engine_lease_released", name=self.name, owner=self.owner)
+
+    def request_stop(self) -> bool:
+        """Ask whichever process holds the lease to stop its engines at its next heartbeat"""
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute("""
+                UPDATE engine_state SET stop_requested = 1
+                WHERE name = ? AND running = 1 AND lease_expires >= ?
+            """, (self.name, time.time()))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def status(self) -> dict:
+        """Shared engine state; running only while the holder keeps its lease fresh"""
+        conn = self.db.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT owner, host, pid, running, stop_requested, started_at, heartbeat_at, lease_expires, url
+                FROM engine_state WHERE name = ?
+            """, (self.name,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return {"running": False, "owner": None, "is_local": False}
+        owner, host, pid, running, stop_requested, started_at, heartbeat_at, lease_expires, url = row
+        return {
+            "running": bool(running) and lease_expires >= time.time(),
+            "owner": owner,
+            "host": host,
+            "pid": pid,
+            "is_local": owner == self.owner,
+            "stop_requested": bool(stop_requested),
+            "started_at": started_at,
+            "heartbeat_at": heartbeat_at,
+            "url": url
+        }
+
+    def _renew(self) -> Optional[str]:
+        """Extend the lease; returns why it cannot be kept, if it cannot"""
+        now = time.time()
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute("""
+                UPDATE engine_state SET heartbeat_at = ?, lease_expires = ?
+                WHERE name = ? AND owner = ? AND running = 1
+            """, (now, now + self.ttl, self.name, self.owner))
+            conn.commit()
+            if cursor.rowcount != 1:
+                return "lost"
+            stop_requested = conn.execute("SELECT stop_requested FROM engine_state WHERE name = ?",
+                                          (self.name,)).fetchone()[0]
+            return "stop_requested" if stop_requested else None
+        finally:
+            conn.close()
+
+    def _run_heartbeat(self, stop: threading.Event):
+        renewed_at = time.monotonic()
+        while not stop.wait(self.heartbeat):
+            try:
+                reason = self._renew()
+            except sqlite3.Error as e:
+                event_log.error("engine_heartbeat_failed", name=self.name, error=str(e))
+                # Once the lease has surely lapsed another process may have started the engines
+                reason = "lost" if time.monotonic() - renewed_at > self.ttl else None
+            else:
+                renewed_at = time.monotonic()
+            if reason and not stop.is_set():
+                self.held = False
+                event_log.log("engine_lease_ended", name=self.name, owner=self.owner, reason=reason)
+                if self.on_lost:
+                    self.on_lost(reason)
+                return
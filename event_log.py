@@ -0,0 +1,115 @@
+"""
+Structured event log for the trading engines
+Queues events on the hot path and writes JSON lines from a background thread
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from typing import List
+
+class EventLog:
+    def __init__(self, path: str = "logs/engine.log", max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, tail_size: int = 1000, echo: bool = True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.echo = echo
+        self.tail = deque(maxlen=tail_size)
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def log(self, event: str, level: str = "INFO", **fields):
+        """Queue an event - formatting and I/O happen on the writer thread"""
+        if self._thread is None:
+            self._start_writer()
+        self._queue.put((time.time(), level, event, fields))
+
+    def error(self, event: str, **fields):
+        self.log(event, level="ERROR", **fields)
+
+    def get_tail(self, limit: int = 100, level: str = None) -> List[dict]:
+        """Return the most recent events, newest last"""
+        records = list(self.tail)
+        if level:
+            records = [r for r in records if r["level"] == level]
+        return records[-limit:]
+
+    def flush(self, timeout: float = 2.0):
+        """Block until every event queued so far has been written"""
+        done = threading.Event()
+        self._queue.put(done)
+        if self._thread is None:
+            self._start_writer()
+        done.wait(timeout)
+
+    def _start_writer(self):
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run_writer, name="EventLogWriter")
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _run_writer(self):
+        """Drain the queue, writing one JSON line per event"""
+        while True:
+            item = self._queue.get()
+            if isinstance(item, threading.Event):
+                if self._file:
+                    self._file.flush()
+                item.set()
+                continue
+
+            ts, level, event, fields = item
+            record = {
+                "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}",
+                "level": level,
+                "event": event
+            }
+            record.update(fields)
+            self.tail.append(record)
+
+            try:
+                line = json.dumps(record, default=str)
+                self._write(line)
+                if self.echo:
+                    sys.stdout.write(line + "\n")
+            except Exception as e:
+                sys.stderr.write(f"Event log write failed: {e}\n")
+
+            if self._file and self._queue.empty():
+                self._file.flush()
+
+    def _write(self, line: str):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+        self._file.write(line + "\n")
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """Rotate engine.log -> engine.log.1 -> ... -> engine.log.N"""
+        self._file.close()
+        self._file = None
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+# Shared instance used by the engines and the web apps
+event_log = EventLog(path=os.getenv("ENGINE_LOG_PATH", "logs/engine.log"))
@@ -1,26 +1,71 @@
+import os
 import threading
 import time
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
 from models import Database, Account, AccountStrategy, Signal, Position
 from kiteconnect import KiteConnect
+from event_log import event_log
+from margin_cache import MarginCache
+from instrument_master import instrument_master
+from signal_journal import signal_journal, new_leg_id
+from metrics import DB_QUERY_SECONDS, KITE_CALL_SECONDS, ORDERS_PLACED, ORDERS_REJECTED, ENGINE_LOOP_LAG
 import json
+from dataclasses import asdict
+
+# Kite order states that can still fill and so must be cancelled before squaring off
+OPEN_ORDER_STATES = {"OPEN", "TRIGGER PENDING", "AMO REQ RECEIVED", "OPEN PENDING", "MODIFY PENDING",
+                     "VALIDATION PENDING", "PUT ORDER REQ RECEIVED"}
 
 class ExecutionEngine:
-    def __init__(self, strategy_engine):
+    def __init__(self, strategy_engine, dispatch_workers: int = 16, netting_window: float = None):
         self.db = Database()
         self.strategy_engine = strategy_engine
+        # Seconds to collect signals before netting them per (account, symbol); 0 disables netting
+        if netting_window is None:
+            netting_window = float(os.getenv("NETTING_WINDOW_SECONDS", "0"))
+        self.netting_window = netting_window
         self.running = False
+        self.thread = None
+        # Order legs for different accounts go out in parallel
+        self.dispatch_pool = ThreadPoolExecutor(max_workers=dispatch_workers,
+                                                thread_name_prefix="ExecutionEngine-dispatch")
+        # At most this many broker requests in flight per account, whichever pool sends them
+        self.basket_concurrency = 4
+        self.basket_pool = ThreadPoolExecutor(max_workers=dispatch_workers * self.basket_concurrency,
+                                              thread_name_prefix="ExecutionEngine-basket")
+        # Price each netted basket with basket_order_margins before sending it (one extra broker call)
+        self.basket_margin_check = os.getenv("BASKET_MARGIN_CHECK") == "1"
+        # account_id -> KiteConnect and account_id -> in-flight request slots, shared by all dispatch threads
+        self._kite_clients = {}
+        self._account_slots = {}
+        self._clients_lock = threading.Lock()
+        # Largest quantity a single leg may size to, whatever the capital
+        self.max_order_quantity = int(os.getenv("MAX_ORDER_QUANTITY", "10"))
+        self.margin_cache = MarginCache(self.get_kite_client, self.get_active_accounts)
+        self.instruments = instrument_master
+        self.journal = signal_journal
+        # Unfinished legs older than this are abandoned on recovery instead of re-sent
+        self.replay_window = float(os.getenv("JOURNAL_REPLAY_WINDOW_SECONDS", "300"))
+        # Emergency stop: accounts being flattened send nothing, and halted ones stay that way until
+        # reactivated; flattening waits (up to drain_timeout) for orders already on the wire
+        self.drain_timeout = 10.0
+        self._sends_changed = threading.Condition()
+        self._sending = {}
+        self._flattening = set()
+        self._halted = set()
         
     def get_account_strategies(self, strategy_id: int) -> List[AccountStrategy]:
         """Get account strategies for a given strategy ID"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM account_strategies 
-            WHERE strategy_id = ? AND is_enabled = 1
-        """, (strategy_id,))
-        rows = cursor.fetchall()
-        conn.close()
+        with DB_QUERY_SECONDS.time(query="get_account_strategies"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT * FROM account_strategies 
+                WHERE strategy_id = ? AND is_enabled = 1
+            """, (strategy_id,))
+            rows = cursor.fetchall()
+            conn.close()
         
         mappings = []
         for row in rows:
@@ -37,11 +82,16 @@ class ExecutionEngine:
     
     def get_account(self, account_id: int) -> Account:
         """Get account by ID"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts WHERE id = ?", (account_id,))
-        row = cursor.fetchone()
-        conn.close()
+        with DB_QUERY_SECONDS.time(query="get_account"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            # Explicit columns: account_name sits at a different position in migrated databases
+            cursor.execute("""
+                SELECT id, broker, api_key, access_token, account_name, capital, max_daily_loss, status, daily_loss
+                FROM accounts WHERE id = ?
+            """, (account_id,))
+            row = cursor.fetchone()
+            conn.close()
         
         if row:
             return Account(
@@ -49,18 +99,36 @@ class ExecutionEngine:
                 broker=row[1],
                 api_key=row[2],
                 access_token=row[3],
-                capital=row[4],
-                max_daily_loss=row[5],
-                status=row[6],
-                daily_loss=row[7]
+                account_name=row[4] or "",
+                capital=float(row[5] or 0),
+                max_daily_loss=float(row[6] or 0),
+                status=row[7],
+                daily_loss=float(row[8] or 0)
             )
         return None
     
+    def get_active_accounts(self) -> List[Account]:
+        """All ACTIVE accounts with a broker session"""
+        with DB_QUERY_SECONDS.time(query="get_active_accounts"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, broker, api_key, access_token, account_name, capital, max_daily_loss, status, daily_loss
+                FROM accounts WHERE status = 'ACTIVE' AND access_token IS NOT NULL AND access_token != ''
+            """)
+            rows = cursor.fetchall()
+            conn.close()
+        return [Account(id=row[0], broker=row[1], api_key=row[2], access_token=row[3], account_name=row[4] or "",
+                        capital=float(row[5] or 0), max_daily_loss=float(row[6] or 0), status=row[7],
+                        daily_loss=float(row[8] or 0)) for row in rows]
+    
     def risk_check(self, account: Account, mapping: AccountStrategy) -> bool:
         """Perform risk checks before placing order"""
         # Check daily loss limit
         if account.daily_loss > account.max_daily_loss:
-            print(f"Account {account.id}: Daily loss limit exceeded")
+            event_log.log("risk_rejected", account_id=account.id, strategy_id=mapping.strategy_id,
+                          reason="daily_loss_limit")
+            ORDERS_REJECTED.inc(reason="daily_loss_limit")
             return False
         
         # Check per-trade risk limit
@@ -68,72 +136,229 @@ class ExecutionEngine:
         trade_risk = allocated_capital * (mapping.max_risk_per_trade / 100)
         
         if trade_risk > allocated_capital:
-            print(f"Account {account.id}: Trade risk exceeds allocation")
+            event_log.log("risk_rejected", account_id=account.id, strategy_id=mapping.strategy_id,
+                          reason="trade_risk_exceeds_allocation")
+            ORDERS_REJECTED.inc(reason="trade_risk_exceeds_allocation")
             return False
         
         return True
     
     def calculate_quantity(self, account: Account, mapping: AccountStrategy, price: float) -> int:
         """Calculate order quantity based on risk parameters"""
-        allocated_capital = account.capital * (mapping.capital_allocation_percent / 100)
+        # Size on what the broker says is available when we have a fresh snapshot
+        capital = account.capital
+        available = self.margin_cache.available_cash(account.id)
+        if available is not None:
+            capital = min(capital, available)
+        allocated_capital = capital * (mapping.capital_allocation_percent / 100)
         trade_risk = allocated_capital * (mapping.max_risk_per_trade / 100)
         
         # Simple quantity calculation - can be enhanced
         quantity = max(1, int(trade_risk / price))
-        return min(quantity, 10)  # Cap at 10 shares for safety
+        return min(quantity, self.max_order_quantity)
+    
+    def get_kite_client(self, account: Account) -> KiteConnect:
+        """Authenticated Kite client for an account, reused so its HTTP session stays alive"""
+        kite = self._kite_clients.get(account.id)
+        if kite is not None and kite.access_token == account.access_token:
+            return kite
+        with self._clients_lock:
+            kite = self._kite_clients.get(account.id)
+            if kite is None or kite.access_token != account.access_token:
+                kite = KiteConnect(api_key=account.api_key,
+                                   pool={"pool_connections": 1, "pool_maxsize": self.basket_concurrency})
+                kite.set_access_token(account.access_token)
+                # Replaces any client holding an older token for this account
+                self._kite_clients[account.id] = kite
+        return kite
+    
+    def account_slot(self, account_id: int) -> threading.BoundedSemaphore:
+        """Hold this around a broker request to respect the account's in-flight limit"""
+        slot = self._account_slots.get(account_id)
+        if slot is None:
+            with self._clients_lock:
+                slot = self._account_slots.setdefault(account_id, threading.BoundedSemaphore(self.basket_concurrency))
+        return slot
     
     def place_order(self, account: Account, signal: Signal, quantity: int):
         """Place order using Zerodha API"""
+        return self.execute_leg(account, signal, quantity)["order_id"]
+    
+    def execute_leg(self, account: Account, signal: Signal, quantity: int, leg_id: str = None) -> dict:
+        """Place one account's order for a signal and report the outcome"""
+        if leg_id is None:
+            leg_id = new_leg_id()
+            self.journal.legs_started([self._journal_leg(leg_id, account.id, signal.symbol, signal.action,
+                                                         quantity, [(signal, quantity)])])
+        result = self._leg_result(signal, account.id, quantity)
+        result.update(self.send_order(account, signal.symbol, signal.action, quantity, signal.signal_id, leg_id))
+        result["leg_id"] = leg_id
+        if result["status"] == "PLACED":
+            result["error"] = self._book(account.id, [(signal, quantity)], leg_id)
+        self.journal.leg_finished(leg_id, result["status"], result["order_id"], result["error"])
+        return result
+    
+    def _book(self, account_id: int, allocations, order_tag: str = None):
+        """Save a filled order's positions; returns an error instead of raising, as the order is already out"""
+        try:
+            self.save_positions(account_id, allocations, order_tag=order_tag)
+            return None
+        except Exception as e:
+            event_log.error("position_booking_failed", account_id=account_id, order_tag=order_tag, error=str(e))
+            return f"booking_failed: {e}"
+    
+    def _journal_leg(self, leg_id: str, account_id: int, symbol: str, action: str, quantity: int,
+                     allocations) -> dict:
+        return {
+            "leg_id": leg_id, "account_id": account_id, "symbol": symbol, "action": action, "qty": quantity,
+            "allocations": [{"signal": asdict(signal), "qty": qty} for signal, qty in allocations]
+        }
+    
+    def send_order(self, account: Account, symbol: str, action: str, quantity: int, signal_id: str = None,
+                   leg_id: str = None) -> dict:
+        """Send a MARKET order to the broker; returns status, order_id, error and latency"""
+        outcome = {"status": "FAILED", "order_id": None, "error": None, "latency_ms": None}
         try:
             if not account.access_token:
-                print(f"Account {account.id}: No access token available")
-                return None
+                event_log.log("order_skipped", signal_id=signal_id, account_id=account.id,
+                              reason="no_access_token")
+                ORDERS_REJECTED.inc(reason="no_access_token")
+                outcome.update(status="SKIPPED", error="no_access_token")
+                return outcome
             
-            kite = KiteConnect(api_key=account.api_key)
-            kite.set_access_token(account.access_token)
+            exchange = "NSE"
+            if self.instruments.loaded:
+                # Reject bad orders here rather than after a broker round trip
+                try:
+                    exchange = self.instruments.validate_order(symbol, quantity).exchange
+                except ValueError as e:
+                    event_log.log("order_rejected", signal_id=signal_id, account_id=account.id,
+                                  symbol=symbol, reason=str(e))
+                    ORDERS_REJECTED.inc(reason=str(e).split(":")[0])
+                    outcome.update(status="REJECTED", error=str(e))
+                    return outcome
+            
+            kite = self.get_kite_client(account)
             
             order_params = {
-                "tradingsymbol": signal.symbol,
-                "exchange": "NSE",
-                "transaction_type": signal.action,
+                "tradingsymbol": symbol,
+                "exchange": exchange,
+                "transaction_type": action,
                 "quantity": quantity,
                 "order_type": "MARKET",
                 "product": "MIS",
                 "validity": "DAY"
             }
+            if leg_id:
+                # Lets recovery find this order in the order book after a crash
+                order_params["tag"] = leg_id
             
-            order_id = kite.place_order(**order_params)
-            print(f"Order placed: {order_id} for account {account.id}")
-            
-            # Save position to database
-            self.save_position(account.id, signal, quantity)
-            
-            return order_id
+            if not self._begin_send(account):
+                event_log.log("order_skipped", signal_id=signal_id, account_id=account.id,
+                              reason="account_halted")
+                ORDERS_REJECTED.inc(reason="account_halted")
+                outcome.update(status="REJECTED", error="account_halted")
+                return outcome
+            try:
+                with self.account_slot(account.id):
+                    started = time.perf_counter()
+                    try:
+                        order_id = kite.place_order(**order_params)
+                    finally:
+                        latency = time.perf_counter() - started
+                        KITE_CALL_SECONDS.observe(latency, call="place_order")
+                        outcome["latency_ms"] = round(latency * 1000, 3)
+            finally:
+                self._end_send(account.id)
+            ORDERS_PLACED.inc(account_id=account.id)
+            event_log.log("order_placed", signal_id=signal_id, account_id=account.id,
+                          order_id=order_id, symbol=symbol, action=action, qty=quantity,
+                          latency_ms=outcome["latency_ms"])
+            outcome.update(status="PLACED", order_id=order_id)
+            self.margin_cache.request_refresh(account)
+            return outcome
             
         except Exception as e:
-            print(f"Order placement failed for account {account.id}: {e}")
-            return None
+            event_log.error("order_failed", signal_id=signal_id, account_id=account.id,
+                            symbol=symbol, error=str(e))
+            ORDERS_REJECTED.inc(reason="broker_error")
+            outcome.update(status="FAILED", error=str(e))
+            return outcome
+    
+    def _begin_send(self, account: Account) -> bool:
+        """Count an order on the wire for the account, unless it is being flattened or stays halted"""
+        reactivated = False
+        if account.id in self._halted:
+            # The account object may predate the emergency stop, so ask the database
+            current = self.get_account(account.id)
+            reactivated = current is not None and current.status == "ACTIVE"
+        with self._sends_changed:
+            if account.id in self._flattening or (account.id in self._halted and not reactivated):
+                return False
+            self._halted.discard(account.id)
+            self._sending[account.id] = self._sending.get(account.id, 0) + 1
+            return True
+    
+    def _end_send(self, account_id: int):
+        with self._sends_changed:
+            self._sending[account_id] -= 1
+            if not self._sending[account_id]:
+                del self._sending[account_id]
+            self._sends_changed.notify_all()
+    
+    def _wait_for_sends(self, account_id: int, timeout: float) -> bool:
+        """Wait until none of the account's orders are still on the wire"""
+        with self._sends_changed:
+            return self._sends_changed.wait_for(lambda: account_id not in self._sending, timeout)
+    
+    def _leg_result(self, signal: Signal, account_id: int, quantity: int, status: str = "PENDING",
+                    error: str = None) -> dict:
+        return {
+            "signal_id": signal.signal_id,
+            "account_id": account_id,
+            "strategy_id": signal.strategy_id,
+            "symbol": signal.symbol,
+            "action": signal.action,
+            "qty": quantity,
+            "status": status,
+            "order_id": None,
+            "error": error,
+            "latency_ms": None
+        }
     
     def save_position(self, account_id: int, signal: Signal, quantity: int):
         """Save position to database"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        
-        qty = quantity if signal.action == "BUY" else -quantity
-        
-        cursor.execute("""
-            INSERT INTO positions (account_id, strategy_id, symbol, qty, entry_price)
-            VALUES (?, ?, ?, ?, ?)
-        """, (account_id, signal.strategy_id, signal.symbol, qty, signal.price))
-        
-        conn.commit()
-        conn.close()
+        self.save_positions(account_id, [(signal, quantity)])
     
-    def process_signal(self, signal: Signal):
-        """Process a trading signal"""
-        mappings = self.get_account_strategies(signal.strategy_id)
-        
-        for mapping in mappings:
+    def save_positions(self, account_id: int, allocations, order_tag: str = None) -> bool:
+        """Save one fill's (signal, quantity) allocations in a single transaction
+
+        With an order_tag nothing is written if that tag is already booked, so
+        replaying a leg after a crash cannot double-count it.
+        """
+        with DB_QUERY_SECONDS.time(query="save_position"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            try:
+                if order_tag:
+                    cursor.execute("SELECT 1 FROM positions WHERE order_tag = ? LIMIT 1", (order_tag,))
+                    if cursor.fetchone():
+                        return False
+                cursor.executemany("""
+                    INSERT INTO positions (account_id, strategy_id, symbol, qty, entry_price, order_tag)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(account_id, signal.strategy_id, signal.symbol,
+                       quantity if signal.action == "BUY" else -quantity, signal.price, order_tag)
+                      for signal, quantity in allocations])
+                conn.commit()
+            finally:
+                conn.close()
+        return True
+    
+    def plan_legs(self, signal: Signal):
+        """Risk-check every account mapped to the signal's strategy and size its leg"""
+        legs, rejected = [], []
+        for mapping in self.get_account_strategies(signal.strategy_id):
             account = self.get_account(mapping.account_id)
             
             if not account or account.status != "ACTIVE":
@@ -141,32 +366,500 @@ class ExecutionEngine:
             
             if self.risk_check(account, mapping):
                 quantity = self.calculate_quantity(account, mapping, signal.price)
-                self.place_order(account, signal, quantity)
+                if self.instruments.loaded:
+                    # Whole lots only, so net orders built from these legs are valid too
+                    try:
+                        _, quantity, _ = self.instruments.prepare_order(signal.symbol, quantity)
+                    except ValueError as e:
+                        ORDERS_REJECTED.inc(reason=str(e).split(":")[0])
+                        rejected.append(self._leg_result(signal, account.id, 0, "REJECTED", str(e)))
+                        continue
+                legs.append((account, mapping, quantity))
+            else:
+                rejected.append(self._leg_result(signal, account.id, 0, "REJECTED", "risk_check_failed"))
+        return legs, rejected
+    
+    def process_signal(self, signal: Signal, on_leg: Callable[[dict], None] = None) -> List[dict]:
+        """Process a trading signal, fanning legs out across accounts concurrently"""
+        started = time.perf_counter()
+        legs, results = self.plan_legs(signal)
+        if on_leg:
+            for result in results:
+                on_leg(result)
+        
+        # Journal every leg in one durable write before any order goes out
+        legs = [(account, mapping, quantity, new_leg_id()) for account, mapping, quantity in legs]
+        self.journal.legs_started([self._journal_leg(leg_id, account.id, signal.symbol, signal.action,
+                                                     quantity, [(signal, quantity)])
+                                   for account, _, quantity, leg_id in legs])
+        
+        def run_leg(leg):
+            account, mapping, quantity, leg_id = leg
+            result = self.execute_leg(account, signal, quantity, leg_id)
+            if on_leg:
+                on_leg(result)
+            return result
+        
+        if len(legs) > 1:
+            results.extend(self.dispatch_pool.map(run_leg, legs))
+        else:
+            results.extend(run_leg(leg) for leg in legs)
+        self.journal.signals_dispatched([signal.signal_id])
+        
+        event_log.log("signal_processed", signal_id=signal.signal_id, strategy_id=signal.strategy_id,
+                      accounts=len(results), latency_ms=round((time.perf_counter() - started) * 1000, 3))
+        return results
+    
+    def process_batch(self, signals: List[Signal], dedup: bool = True) -> List[dict]:
+        """Process many signals as one group: dedup, net per (account, symbol), risk-check, dispatch"""
+        started = time.perf_counter()
+        seen, results, contributions = set(), [], []
+        for signal in signals:
+            # Only a resent signal is a duplicate; distinct signals for the same symbol all trade
+            if dedup and signal.signal_id in seen:
+                for mapping in self.get_account_strategies(signal.strategy_id):
+                    account = self.get_account(mapping.account_id)
+                    if account and account.status == "ACTIVE":
+                        results.append(self._leg_result(signal, account.id, 0, "DUPLICATE"))
+                continue
+            seen.add(signal.signal_id)
+            
+            legs, rejected = self.plan_legs(signal)
+            results.extend(rejected)
+            contributions.extend((signal, account, quantity) for account, _, quantity in legs)
+        
+        results.extend(self.execute_netted(contributions))
+        self.journal.signals_dispatched([signal.signal_id for signal in signals])
+        event_log.log("batch_processed", signals=len(signals), legs=len(results),
+                      latency_ms=round((time.perf_counter() - started) * 1000, 3))
+        return results
+    
+    def net_contributions(self, contributions) -> List[dict]:
+        """Group (signal, account, quantity) legs per (account, symbol) and net their quantities"""
+        groups = {}
+        for signal, account, quantity in contributions:
+            group = groups.setdefault((account.id, signal.symbol), {
+                "account": account, "symbol": signal.symbol, "net_qty": 0, "contributions": []
+            })
+            group["net_qty"] += quantity if signal.action == "BUY" else -quantity
+            group["contributions"].append((signal, quantity))
+        return list(groups.values())
+    
+    def basket_risk_check(self, account: Account, groups: List[dict]) -> bool:
+        """The account's net orders together must fit inside its capital"""
+        if account.daily_loss > account.max_daily_loss:
+            return False
+        notional = sum(abs(g["net_qty"]) * g["contributions"][0][0].price for g in groups)
+        return notional <= account.capital
+    
+    def execute_netted(self, contributions) -> List[dict]:
+        """Send one net order per (account, symbol) and allocate it back to each strategy"""
+        groups = self.net_contributions(contributions)
+        
+        by_account = {}
+        for group in groups:
+            by_account.setdefault(group["account"].id, []).append(group)
+        approved = []
+        results = []
+        for account_groups in by_account.values():
+            account = account_groups[0]["account"]
+            if self.basket_risk_check(account, account_groups):
+                approved.append(account_groups)
+            else:
+                ORDERS_REJECTED.inc(reason="basket_risk")
+                event_log.log("risk_rejected", account_id=account.id, reason="basket_risk")
+                for group in account_groups:
+                    results.extend(self._allocate(group, {"status": "REJECTED", "order_id": None,
+                                                          "error": "basket_risk_check_failed",
+                                                          "latency_ms": None}))
+        
+        # Journal every net order in one durable write before any of them goes out
+        journaled = []
+        for account_groups in approved:
+            for group in account_groups:
+                if group["net_qty"] != 0:
+                    group["leg_id"] = new_leg_id()
+                    journaled.append(self._journal_leg(
+                        group["leg_id"], group["account"].id, group["symbol"],
+                        "BUY" if group["net_qty"] > 0 else "SELL", abs(group["net_qty"]),
+                        group["contributions"]))
+        self.journal.legs_started(journaled)
+        
+        def dispatch(account_groups):
+            # Strategies that crossed each other internally send nothing to the broker
+            allocated = []
+            orders, to_send = [], []
+            for group in account_groups:
+                net_qty = group["net_qty"]
+                if net_qty == 0:
+                    allocated.extend(self._allocate(group, {"status": "NETTED", "order_id": None,
+                                                            "error": None, "latency_ms": None}))
+                    continue
+                orders.append({
+                    "symbol": group["symbol"],
+                    "action": "BUY" if net_qty > 0 else "SELL",
+                    "quantity": abs(net_qty),
+                    "signal_id": ",".join(sorted({s.signal_id for s, _ in group["contributions"]})),
+                    "leg_id": group["leg_id"]
+                })
+                to_send.append(group)
+            
+            if orders:
+                outcomes = self.place_basket(account_groups[0]["account"], orders,
+                                             check_margins=self.basket_margin_check)
+                for group, outcome in zip(to_send, outcomes):
+                    allocated.extend(self._allocate(group, outcome))
+            return allocated
+        
+        if len(approved) > 1:
+            for allocated in self.dispatch_pool.map(dispatch, approved):
+                results.extend(allocated)
+        else:
+            for account_groups in approved:
+                results.extend(dispatch(account_groups))
+        return results
+    
+    def place_basket(self, account: Account, orders: List[dict], check_margins: bool = False) -> List[dict]:
+        """Place several orders for one account over its shared keep-alive session
+
+        Kite has no multi-order placement endpoint, so legs are pipelined
+        concurrently on the account's pooled connection, at most
+        basket_concurrency at a time. With check_margins the whole basket is
+        first priced in a single basket_order_margins call.
+        """
+        if check_margins and account.access_token:
+            rejection = self._basket_margin_rejection(account, orders)
+            if rejection:
+                return [dict(rejection) for _ in orders]
+        
+        def send(order):
+            return self.send_order(account, order["symbol"], order["action"], order["quantity"],
+                                   order.get("signal_id"), order.get("leg_id"))
+        
+        if len(orders) == 1:
+            return [send(orders[0])]
+        return list(self.basket_pool.map(send, orders))
+    
+    def _exchange(self, symbol: str) -> str:
+        instrument = self.instruments.get(symbol)
+        return instrument.exchange if instrument else "NSE"
+    
+    def _basket_margin_rejection(self, account: Account, orders: List[dict]):
+        """Return a REJECTED outcome if the basket needs more margin than is available"""
+        try:
+            kite = self.get_kite_client(account)
+            params = [{
+                "exchange": self._exchange(order["symbol"]),
+                "tradingsymbol": order["symbol"],
+                "transaction_type": order["action"],
+                "variety": "regular",
+                "product": "MIS",
+                "order_type": "MARKET",
+                "quantity": order["quantity"]
+            } for order in orders]
+            with self.account_slot(account.id), KITE_CALL_SECONDS.time(call="basket_order_margins"):
+                basket = kite.basket_order_margins(params, consider_positions=True, mode="compact")
+                available = kite.margins("equity").get("net", 0)
+            required = basket.get("final", {}).get("total", 0)
+        except Exception as e:
+            event_log.error("basket_margin_check_failed", account_id=account.id, error=str(e))
+            return None
+        if required > available:
+            ORDERS_REJECTED.inc(reason="insufficient_margin")
+            return {"status": "REJECTED", "order_id": None, "latency_ms": None,
+                    "error": f"insufficient_margin: required {required:.2f}, available {available:.2f}"}
+        return None
+    
+    def _allocate(self, group: dict, outcome: dict) -> List[dict]:
+        """Per-strategy results for a net order; filled legs go into each strategy's position book"""
+        if outcome["status"] in ("PLACED", "NETTED"):
+            booking_error = self._book(group["account"].id, group["contributions"], group.get("leg_id"))
+            if booking_error:
+                outcome = dict(outcome, error=booking_error)
+        results = []
+        for signal, quantity in group["contributions"]:
+            result = self._leg_result(signal, group["account"].id, quantity)
+            result.update(outcome)
+            result["net_qty"] = group["net_qty"]
+            results.append(result)
+        if group.get("leg_id"):
+            self.journal.leg_finished(group["leg_id"], outcome["status"], outcome["order_id"], outcome["error"])
+        return results
+    
+    def flatten_accounts(self, accounts: List[Account], max_workers: int = 32) -> List[dict]:
+        """Cancel open orders and square off every net position, all accounts in parallel
+
+        Returns one report per account with its own completion time. Strategy
+        books are then closed out against the square-off fills. No new order goes
+        out for these accounts until they are reactivated.
+        """
+        accounts = list(accounts)
+        if not accounts:
+            return []
+        account_ids = {account.id for account in accounts}
+        with self._sends_changed:
+            self._flattening |= account_ids
+            self._halted |= account_ids
+        try:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(accounts)),
+                                    thread_name_prefix="ExecutionEngine-flatten") as pool:
+                reports = list(pool.map(self._flatten_account_safely, accounts))
+        finally:
+            with self._sends_changed:
+                self._flattening -= account_ids
+        self._book_square_offs(reports)
+        return reports
+    
+    def _flatten_account_safely(self, account: Account) -> dict:
+        """flatten_account, reporting an unexpected error as FAILED so the other accounts still run"""
+        started = time.perf_counter()
+        try:
+            return self.flatten_account(account)
+        except Exception as e:
+            event_log.error("account_flatten_failed", account_id=account.id, error=str(e))
+            return {"account_id": account.id, "status": "FAILED", "cancelled": 0, "square_offs": [],
+                    "errors": [str(e)], "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+    
+    def flatten_account(self, account: Account) -> dict:
+        """Cancel an account's open orders, then close its broker net positions with MARKET orders"""
+        started = time.perf_counter()
+        report = {"account_id": account.id, "status": "FLATTENED", "cancelled": 0, "square_offs": [],
+                  "errors": [], "elapsed_ms": None}
+        if not account.access_token:
+            report.update(status="SKIPPED", elapsed_ms=0.0)
+            report["errors"].append("no_access_token")
+            return report
+        
+        # Orders already on the wire must reach the order book first, or they would be missed below
+        if not self._wait_for_sends(account.id, self.drain_timeout):
+            report["errors"].append(f"orders still in flight after {self.drain_timeout}s")
+        
+        kite = self.get_kite_client(account)
+        try:
+            with KITE_CALL_SECONDS.time(call="orders"):
+                open_orders = [o for o in kite.orders() if o.get("status") in OPEN_ORDER_STATES]
+        except Exception as e:
+            open_orders = []
+            report["errors"].append(f"orders: {e}")
+        
+        def cancel(order):
+            try:
+                with self.account_slot(account.id), KITE_CALL_SECONDS.time(call="cancel_order"):
+                    kite.cancel_order(variety=order.get("variety") or "regular", order_id=order["order_id"])
+                return None
+            except Exception as e:
+                return f"cancel {order['order_id']}: {e}"
+        
+        # Open orders go first so none of them can fill after its position is closed
+        for error in self.basket_pool.map(cancel, open_orders):
+            if error:
+                report["errors"].append(error)
+            else:
+                report["cancelled"] += 1
+        
+        try:
+            with KITE_CALL_SECONDS.time(call="positions"):
+                net_positions = [p for p in kite.positions().get("net", []) if p.get("quantity")]
+        except Exception as e:
+            net_positions = []
+            report["errors"].append(f"positions: {e}")
+        
+        def square_off(position):
+            quantity = position["quantity"]
+            result = {"symbol": position["tradingsymbol"], "product": position["product"], "qty": -quantity,
+                      "price": position.get("last_price") or 0.0, "leg_id": new_leg_id(),
+                      "order_id": None, "error": None}
+            try:
+                with self.account_slot(account.id), KITE_CALL_SECONDS.time(call="place_order"):
+                    result["order_id"] = str(kite.place_order(
+                        variety="regular",
+                        exchange=position["exchange"],
+                        tradingsymbol=position["tradingsymbol"],
+                        transaction_type="SELL" if quantity > 0 else "BUY",
+                        quantity=abs(quantity),
+                        order_type="MARKET",
+                        product=position["product"],
+                        validity="DAY",
+                        tag=result["leg_id"]
+                    ))
+                ORDERS_PLACED.inc(account_id=account.id)
+            except Exception as e:
+                result["error"] = str(e)
+            return result
+        
+        report["square_offs"] = list(self.basket_pool.map(square_off, net_positions))
+        report["errors"].extend(f"square_off {r['symbol']}: {r['error']}" for r in report["square_offs"]
+                                if r["error"])
+        if report["errors"]:
+            report["status"] = "PARTIAL" if report["cancelled"] or any(
+                r["order_id"] for r in report["square_offs"]) else "FAILED"
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        event_log.log("account_flattened", account_id=account.id, status=report["status"],
+                      cancelled=report["cancelled"], square_offs=len(report["square_offs"]),
+                      latency_ms=report["elapsed_ms"])
+        return report
+    
+    def _book_square_offs(self, reports: List[dict]):
+        """Close each strategy's net position in a symbol that was squared off at the broker
+
+        Strategy orders are all intraday (MIS), so only the MIS square-off of a symbol closes them;
+        a delivery holding in the same symbol is squared off at the broker but not booked here.
+        """
+        placed = {(report["account_id"], r["symbol"], r["product"]): r for report in reports
+                  for r in report["square_offs"] if r["order_id"]}
+        if not placed:
+            return
+        account_ids = sorted({account_id for account_id, _, _ in placed})
+        with DB_QUERY_SECONDS.time(query="get_open_nets"):
+            conn = self.db.get_connection()
+            rows = conn.execute(f"""
+                SELECT account_id, strategy_id, symbol, SUM(qty) FROM positions
+                WHERE account_id IN ({",".join("?" * len(account_ids))})
+                GROUP BY account_id, strategy_id, symbol HAVING SUM(qty) != 0
+            """, account_ids).fetchall()
+            conn.close()
+        
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        bookings = {}
+        for account_id, strategy_id, symbol, net in rows:
+            square_off = placed.get((account_id, symbol, "MIS"))
+            if square_off is None:
+                continue
+            closing = Signal(strategy_id=strategy_id, symbol=symbol, action="SELL" if net > 0 else "BUY",
+                             price=square_off["price"], timestamp=timestamp)
+            bookings.setdefault((account_id, square_off["leg_id"]), []).append((closing, abs(net)))
+        for (account_id, leg_id), allocations in bookings.items():
+            self.save_positions(account_id, allocations, order_tag=leg_id)
     
     def start(self):
         """Start the execution engine"""
+        # Replayed legs are validated against the instrument master, so load it first
+        self.load_instruments()
+        self.recover()
         self.running = True
-        thread = threading.Thread(target=self._run_loop)
-        thread.daemon = True
-        thread.start()
-        print("Execution Engine started")
+        self.thread = threading.Thread(target=self._run_loop, name="ExecutionEngine")
+        self.thread.daemon = True
+        self.thread.start()
+        reload_thread = threading.Thread(target=self._run_instrument_reload, name="InstrumentReload")
+        reload_thread.daemon = True
+        reload_thread.start()
+        self.margin_cache.start()
+        event_log.log("engine_started", engine="execution")
+    
+    def recover(self) -> dict:
+        """Settle legs and signals a previous process left unfinished in the journal
+
+        A leg found in the broker's order book (by its tag) is booked as placed,
+        or settled as rejected if the broker rejected or cancelled it; a recent
+        leg the broker never saw is sent again with the same tag if its account
+        is still active; other legs are abandoned. Signals that never got as far
+        as legs are re-queued while still fresh. Positions are keyed by tag, so
+        replays are idempotent. Runs on every start; legs and signals this
+        process is still handling are not part of what it recovers.
+        """
+        signals, legs = self.journal.pending()
+        summary = {"legs_found": 0, "legs_rejected": 0, "legs_resent": 0, "legs_abandoned": 0,
+                   "signals_requeued": 0, "signals_expired": 0}
+        now = time.time()
+        
+        by_account = {}
+        for leg in legs:
+            by_account.setdefault(leg["account_id"], []).append(leg)
+        for account_id, account_legs in by_account.items():
+            account = self.get_account(account_id)
+            try:
+                with KITE_CALL_SECONDS.time(call="orders"):
+                    orders = self.get_kite_client(account).orders() if account and account.access_token else []
+            except Exception as e:
+                event_log.error("recovery_orders_failed", account_id=account_id, error=str(e))
+                continue  # Leave these legs in the journal for the next start
+            tagged = {o.get("tag"): o for o in orders if o.get("tag")}
+            
+            for leg in account_legs:
+                allocations = [(Signal(**a["signal"]), a["qty"]) for a in leg["allocations"]]
+                order = tagged.get(leg["leg_id"])
+                if order is not None and order.get("status") in ("REJECTED", "CANCELLED"):
+                    # The broker saw it and said no; sending it again would just repeat that
+                    outcome = {"status": "REJECTED", "order_id": order.get("order_id"),
+                               "error": order.get("status_message") or order.get("status")}
+                    summary["legs_rejected"] += 1
+                elif order is not None:
+                    outcome = {"status": "PLACED", "order_id": order.get("order_id"), "error": None}
+                    summary["legs_found"] += 1
+                elif not account or account.status != "ACTIVE":
+                    outcome = {"status": "ABANDONED", "order_id": None, "error": "account_inactive"}
+                    summary["legs_abandoned"] += 1
+                elif now - leg["journaled_at"] <= self.replay_window:
+                    outcome = self.send_order(account, leg["symbol"], leg["action"], leg["qty"],
+                                              leg_id=leg["leg_id"])
+                    summary["legs_resent"] += 1
+                else:
+                    outcome = {"status": "ABANDONED", "order_id": None, "error": "stale_after_restart"}
+                    summary["legs_abandoned"] += 1
+                if outcome["status"] == "PLACED":
+                    self.save_positions(account_id, allocations, order_tag=leg["leg_id"])
+                self.journal.leg_finished(leg["leg_id"], outcome["status"], outcome["order_id"], outcome["error"])
+        
+        expired = []
+        for record in signals:
+            if now - record["ts"] <= self.replay_window:
+                # Claimed first, so a later start in this process does not queue it again
+                self.journal.claim([record["signal"]["signal_id"]])
+                self.strategy_engine.signals.append(Signal(**record["signal"]))
+                summary["signals_requeued"] += 1
+            else:
+                expired.append(record["signal"]["signal_id"])
+        self.journal.signals_dispatched(expired, status="EXPIRED")
+        summary["signals_expired"] = len(expired)
+        
+        self.journal.compact()
+        if legs or signals:
+            event_log.log("journal_recovered", **summary)
+        return summary
+    
+    def load_instruments(self) -> bool:
+        """Load today's instrument master, downloading it with any active account's session"""
+        accounts = self.get_active_accounts()
+        kite = self.get_kite_client(accounts[0]) if accounts else None
+        return self.instruments.ensure_loaded(kite)
+    
+    def _run_instrument_reload(self, interval: float = 60):
+        """Pick up each new day's instrument dump while the engine keeps running"""
+        while self.running:
+            time.sleep(interval)
+            if self.running and self.instruments.stale:
+                try:
+                    self.load_instruments()
+                except Exception as e:
+                    event_log.error("instrument_reload_failed", error=str(e))
     
     def stop(self):
         """Stop the execution engine"""
         self.running = False
-        print("Execution Engine stopped")
+        self.margin_cache.stop()
+        event_log.log("engine_stopped", engine="execution")
     
     def _run_loop(self):
         """Main execution loop"""
+        next_tick = time.monotonic()
         while self.running:
             try:
+                ENGINE_LOOP_LAG.set(max(0.0, time.monotonic() - next_tick), engine="execution")
                 signals = self.strategy_engine.get_pending_signals()
                 
-                for signal in signals:
-                    self.process_signal(signal)
+                if signals and self.netting_window > 0:
+                    # Let the rest of this strategy cycle arrive, then send only net orders
+                    time.sleep(self.netting_window)
+                    signals.extend(self.strategy_engine.get_pending_signals())
+                    self.process_batch(signals, dedup=False)
+                else:
+                    for signal in signals:
+                        self.process_signal(signal)
                 
+                next_tick = time.monotonic() + 1
                 time.sleep(1)  # Check for signals every second
                 
             except Exception as e:
-                print(f"Execution engine error: {e}")
+                event_log.error("engine_error", engine="execution", error=str(e))
+                next_tick = time.monotonic() + 5
                 time.sleep(5)
\ No newline at end of file
@@ -0,0 +1,194 @@
+"""
+Export Service - stream positions and P&L to CSV, JSON or Parquet
+Reads fixed-size chunks from SQLite so memory use stays flat whatever the table size
+
+Usage:
+    python export_service.py positions --format csv --output positions.csv --date-from 2026-10-19
+    python export_service.py pnl --format parquet --output pnl.parquet
+    python export_service.py history --format csv --output history.csv --date-from 2026-01-01
+"""
+
+import argparse
+import csv
+import io
+import json
+import itertools
+import sys
+from typing import Iterator, List
+
+from data_service import DataService
+from archive_service import ArchiveService
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+# Positions rows are the fill records: one row per order leg the engine placed
+DATASETS = {
+    "positions": ['id', 'account_id', 'account_name', 'strategy_id', 'strategy_name',
+                  'symbol', 'qty', 'entry_price', 'pnl', 'created_at'],
+    "history": ['id', 'account_id', 'account_name', 'strategy_id', 'strategy_name',
+                'symbol', 'qty', 'entry_price', 'pnl', 'created_at'],
+    "pnl": ['account_id', 'account_name', 'strategy_id', 'strategy_name', 'total_positions',
+            'long_positions', 'short_positions', 'total_pnl', 'daily_loss', 'max_daily_loss'],
+}
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "json": ("application/json", "json"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands its buffered bytes back on demand"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+class ExportService:
+    def __init__(self, data_service: DataService = None, chunk_size: int = 5000):
+        self.data_service = data_service or DataService()
+        self.chunk_size = chunk_size
+
+    def iter_chunks(self, dataset: str, **filters) -> Iterator[List[dict]]:
+        """Yield lists of at most chunk_size rows"""
+        if dataset == "positions":
+            cursor = None
+            while True:
+                page = self.data_service.get_positions_page(limit=self.chunk_size, cursor=cursor, **filters)
+                if page['positions']:
+                    yield page['positions']
+                cursor = page['next_cursor']
+                if cursor is None:
+                    return
+        elif dataset == "history":
+            # Hot table plus the monthly archive databases
+            rows = ArchiveService(self.data_service).iter_history(chunk_size=self.chunk_size, **filters)
+            while True:
+                chunk = list(itertools.islice(rows, self.chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+        elif dataset == "pnl":
+            rows = self.data_service.get_pnl_report(filters.get('account_id'), filters.get('strategy_id'))
+            for i in range(0, len(rows), self.chunk_size):
+                yield rows[i:i + self.chunk_size]
+        else:
+            raise ValueError(f"Unknown dataset '{dataset}', expected one of: {', '.join(DATASETS)}")
+
+    def stream(self, dataset: str, export_format: str, **filters) -> Iterator:
+        """Generator of str (csv/json) or bytes (parquet) pieces for the chosen format"""
+        if dataset not in DATASETS:
+            raise ValueError(f"Unknown dataset '{dataset}', expected one of: {', '.join(DATASETS)}")
+        if export_format == "csv":
+            return self.stream_csv(dataset, **filters)
+        if export_format == "json":
+            return self.stream_json(dataset, **filters)
+        if export_format == "parquet":
+            return self.stream_parquet(dataset, **filters)
+        raise ValueError(f"Unknown format '{export_format}', expected one of: {', '.join(FORMATS)}")
+
+    def stream_csv(self, dataset: str, **filters) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=DATASETS[dataset], extrasaction='ignore')
+        writer.writeheader()
+        for chunk in self.iter_chunks(dataset, **filters):
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    def stream_json(self, dataset: str, **filters) -> Iterator[str]:
+        """A JSON array, emitted one chunk of rows at a time"""
+        fields = DATASETS[dataset]
+        yield "["
+        first = True
+        for chunk in self.iter_chunks(dataset, **filters):
+            body = ",".join(json.dumps({f: row[f] for f in fields}) for row in chunk)
+            yield ("" if first else ",") + body
+            first = False
+        yield "]"
+
+    def stream_parquet(self, dataset: str, **filters) -> Iterator[bytes]:
+        """One Parquet row group per chunk, streamed as it is written"""
+        if pq is None:
+            raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+        return self._generate_parquet(dataset, **filters)
+
+    def _generate_parquet(self, dataset: str, **filters) -> Iterator[bytes]:
+        fields = DATASETS[dataset]
+        sink = _ChunkSink()
+        writer = None
+        for chunk in self.iter_chunks(dataset, **filters):
+            table = pa.Table.from_pydict({f: [row[f] for row in chunk] for f in fields})
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is None:
+            # Empty export: still produce a valid file with the dataset's columns
+            writer = pq.ParquetWriter(sink, pa.schema([(f, pa.string()) for f in fields]))
+        writer.close()
+        yield sink.drain()
+
+    def export_to_file(self, dataset: str, export_format: str, path: str, **filters) -> int:
+        """Write an export to disk and return the number of bytes written"""
+        written = 0
+        mode = "wb" if export_format == "parquet" else "w"
+        with open(path, mode, **({} if mode == "wb" else {"encoding": "utf-8", "newline": ""})) as f:
+            for piece in self.stream(dataset, export_format, **filters):
+                f.write(piece)
+                written += len(piece)
+        return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Export trading data for end-of-day reporting")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--output", help="file to write (default: stdout, csv/json only)")
+    parser.add_argument("--account-id", type=int)
+    parser.add_argument("--strategy-id", type=int)
+    parser.add_argument("--symbol")
+    parser.add_argument("--date-from", help="YYYY-MM-DD")
+    parser.add_argument("--date-to", help="YYYY-MM-DD (inclusive)")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    filters = {"account_id": args.account_id, "strategy_id": args.strategy_id}
+    if args.dataset in ("positions", "history"):
+        filters.update(symbol=args.symbol, date_from=args.date_from, date_to=args.date_to)
+
+    service = ExportService(chunk_size=args.chunk_size)
+    if args.output:
+        written = service.export_to_file(args.dataset, args.format, args.output, **filters)
+        print(f"[OK] Wrote {written:,} bytes to {args.output}", file=sys.stderr)
+    elif args.format == "parquet":
+        parser.error("--output is required for parquet")
+    else:
+        for piece in service.stream(args.dataset, args.format, **filters):
+            sys.stdout.write(piece)
+        sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    main()
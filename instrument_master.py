@@ -0,0 +1,282 @@
+"""
+Instrument Master - daily broker instrument dump in a memory-mapped fixed-record file
+Gives O(1) symbol/token lookups and local lot-size and tick-size checks before orders go out.
+The lookup tables are open-addressed hash tables stored in the dump itself, so
+loading is a single mmap however many instruments there are.
+
+Usage:
+    python instrument_master.py --download
+    python instrument_master.py --lookup RELIANCE
+"""
+
+import argparse
+import glob
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+from event_log import event_log
+from metrics import KITE_CALL_SECONDS
+
+Instrument = namedtuple("Instrument", "instrument_token exchange_token tradingsymbol exchange "
+                                      "instrument_type tick_size lot_size")
+
+# magic, record count, hash slots per table
+HEADER = struct.Struct("<8sII")
+MAGIC = b"INSTRv1\0"
+# instrument_token, exchange_token, tick_size, lot_size, exchange, instrument_type, tradingsymbol
+RECORD = struct.Struct("<IIdI4s4s32s")
+# Records are followed by three tables of record indexes: (exchange, symbol), bare symbol, token
+SLOT = struct.Struct("<I")
+EMPTY = 0xFFFFFFFF
+BY_SYMBOL, BY_BARE_SYMBOL, BY_TOKEN = range(3)
+
+def _symbol_key(exchange: bytes, symbol: bytes) -> int:
+    return zlib.crc32(symbol, zlib.crc32(exchange + b"\0"))
+
+def _token_key(token: int) -> int:
+    return zlib.crc32(SLOT.pack(token))
+
+class InstrumentMaster:
+    def __init__(self, data_dir: str = "instruments", exchanges: Iterable[str] = ("NSE",), keep_days: int = 7,
+                 download_retry: float = 900.0):
+        self.data_dir = data_dir
+        # Earlier exchanges win when a bare symbol is listed on several
+        self.exchanges = tuple(exchanges)
+        # Dumps kept on disk, including the newest; 0 keeps only the newest
+        self.keep_days = keep_days
+        # A failed download is not retried sooner than this, however often the dump is asked for
+        self.download_retry = download_retry
+        self.loaded_date = None
+        self._retry_at = 0.0
+        # (mmap, record count, hash slots), swapped as one so readers never mix dumps
+        self._state: Optional[Tuple[mmap.mmap, int, int]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    @property
+    def stale(self) -> bool:
+        """Whether the loaded dump (if any) is from an earlier day than today"""
+        return self.loaded_date != date.today()
+
+    def __len__(self) -> int:
+        return self._state[1] if self._state else 0
+
+    def dump_path(self, day: date) -> str:
+        """instruments/instruments_2026-10-19.bin"""
+        return os.path.join(self.data_dir, f"instruments_{day.isoformat()}.bin")
+
+    def ensure_loaded(self, kite=None) -> bool:
+        """Load today's dump, downloading it with `kite` if needed
+
+        Without a client, yesterday's (or older) dump is better than nothing.
+        Returns whether an instrument set is loaded.
+        """
+        if not self.stale:
+            return True
+        path = self.dump_path(date.today())
+        if os.path.exists(path):
+            self.load(path)
+            return True
+        if kite is not None and time.monotonic() >= self._retry_at:
+            try:
+                self.download(kite, path)
+                self.load(path)
+                return True
+            except Exception as e:
+                self._retry_at = time.monotonic() + self.download_retry
+                event_log.error("instrument_download_failed", error=str(e))
+        # Otherwise the newest dump, unless the one already loaded is at least as new
+        dumps = sorted(older for older in glob.glob(os.path.join(self.data_dir, "instruments_*.bin")) if older != path)
+        if dumps and (not self.loaded_date or dumps[-1] > self.dump_path(self.loaded_date)):
+            self.load(dumps[-1])
+        return self.loaded
+
+    def download(self, kite, path: str) -> int:
+        """Fetch the instrument lists and write them as fixed-size records plus hash tables"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        instruments = []
+        for exchange in self.exchanges:
+            with KITE_CALL_SECONDS.time(call="instruments"):
+                instruments.extend(kite.instruments(exchange))
+
+        records, keys = [], []
+        rank = {exchange: i for i, exchange in enumerate(self.exchanges)}
+        preferred = {}
+        for inst in instruments:
+            symbol = inst["tradingsymbol"].encode()
+            exchange = inst["exchange"].encode()
+            if len(symbol) > 32 or len(exchange) > 4:
+                continue
+            token = int(inst["instrument_token"])
+            index = len(records)
+            records.append(RECORD.pack(token, int(inst.get("exchange_token") or 0),
+                                       float(inst.get("tick_size") or 0.05), int(inst.get("lot_size") or 1),
+                                       exchange, (inst.get("instrument_type") or "").encode(), symbol))
+            keys.append((_symbol_key(exchange, symbol), _token_key(token)))
+            current = preferred.get(symbol)
+            if current is None or rank.get(inst["exchange"], len(rank)) < current[0]:
+                preferred[symbol] = (rank.get(inst["exchange"], len(rank)), index)
+
+        # At most half full, so probes stay short
+        slots = 8
+        while slots < 2 * len(records):
+            slots *= 2
+        tables = [[EMPTY] * slots for _ in range(3)]
+
+        def insert(table, key, index):
+            slot = key % slots
+            while table[slot] != EMPTY:
+                slot = (slot + 1) % slots
+            table[slot] = index
+
+        # Later records win a duplicated key, as they would in a dict, so insert them first
+        for index in range(len(records) - 1, -1, -1):
+            symbol_key, token_key = keys[index]
+            insert(tables[BY_SYMBOL], symbol_key, index)
+            insert(tables[BY_TOKEN], token_key, index)
+        for symbol, (_, index) in preferred.items():
+            insert(tables[BY_BARE_SYMBOL], zlib.crc32(symbol), index)
+
+        # Write then rename so a crashed download never leaves a half file behind
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(records), slots))
+            f.write(b"".join(records))
+            for table in tables:
+                f.write(struct.pack(f"<{slots}I", *table))
+        os.replace(tmp_path, path)
+        self._prune()
+        event_log.log("instruments_downloaded", path=path, count=len(records))
+        return len(records)
+
+    def load(self, path: str):
+        """Memory-map a dump; its hash tables are used in place, nothing is rebuilt"""
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < HEADER.size:
+            mm.close()
+            raise ValueError(f"{path} is not a valid instrument dump")
+        magic, count, slots = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or len(mm) != HEADER.size + count * RECORD.size + 3 * slots * SLOT.size:
+            mm.close()
+            raise ValueError(f"{path} is not a valid instrument dump")
+
+        # The previous mapping is released once no reader holds it any more
+        self._state = (mm, count, slots)
+        name = os.path.basename(path)
+        self.loaded_date = date.fromisoformat(name[len("instruments_"):-len(".bin")])
+        event_log.log("instruments_loaded", path=path, count=count)
+
+    def get(self, symbol: str, exchange: Optional[str] = None) -> Optional[Instrument]:
+        """Instrument for a trading symbol; without an exchange the preferred listing is used"""
+        state = self._state
+        if state is None:
+            return None
+        encoded = symbol.encode()
+        if exchange:
+            key, table = _symbol_key(exchange.encode(), encoded), BY_SYMBOL
+        else:
+            key, table = zlib.crc32(encoded), BY_BARE_SYMBOL
+        return self._probe(state, table, key,
+                           lambda inst: inst.tradingsymbol == symbol and (not exchange or inst.exchange == exchange))
+
+    def by_token(self, instrument_token: int) -> Optional[Instrument]:
+        state = self._state
+        if state is None:
+            return None
+        return self._probe(state, BY_TOKEN, _token_key(instrument_token),
+                           lambda inst: inst.instrument_token == instrument_token)
+
+    def prepare_order(self, symbol: str, quantity: int, price: Optional[float] = None,
+                      exchange: Optional[str] = None) -> Tuple[Instrument, int, Optional[float]]:
+        """Validate an order locally and round it to the instrument's lot and tick size
+
+        Raises ValueError for unknown symbols and quantities smaller than one lot.
+        """
+        instrument = self.get(symbol, exchange)
+        if instrument is None:
+            raise ValueError(f"unknown_symbol: {symbol}")
+        quantity = quantity - quantity % instrument.lot_size
+        if quantity <= 0:
+            raise ValueError(f"below_lot_size: {symbol} trades in lots of {instrument.lot_size}")
+        if price is not None and instrument.tick_size:
+            price = round(round(price / instrument.tick_size) * instrument.tick_size, 2)
+        return instrument, quantity, price
+
+    def validate_order(self, symbol: str, quantity: int, exchange: Optional[str] = None) -> Instrument:
+        """Raise ValueError unless the symbol exists and the quantity is a whole number of lots"""
+        instrument = self.get(symbol, exchange)
+        if instrument is None:
+            raise ValueError(f"unknown_symbol: {symbol}")
+        if quantity <= 0 or quantity % instrument.lot_size:
+            raise ValueError(f"invalid_lot_size: {symbol} trades in lots of {instrument.lot_size}, got {quantity}")
+        return instrument
+
+    @staticmethod
+    def _record(mm, index: int) -> Instrument:
+        token, exchange_token, tick_size, lot_size, exchange, instrument_type, symbol = RECORD.unpack_from(
+            mm, HEADER.size + index * RECORD.size)
+        return Instrument(token, exchange_token, symbol.rstrip(b"\0").decode(), exchange.rstrip(b"\0").decode(),
+                          instrument_type.rstrip(b"\0").decode(), tick_size, lot_size)
+
+    @staticmethod
+    def _probe(state, table: int, key: int, matches) -> Optional[Instrument]:
+        mm, count, slots = state
+        base = HEADER.size + count * RECORD.size + table * slots * SLOT.size
+        slot = key % slots
+        for _ in range(slots):
+            index = SLOT.unpack_from(mm, base + slot * SLOT.size)[0]
+            if index == EMPTY:
+                return None
+            instrument = InstrumentMaster._record(mm, index)
+            if matches(instrument):
+                return instrument
+            slot = (slot + 1) % slots
+        return None
+
+    def _prune(self):
+        dumps = sorted(glob.glob(os.path.join(self.data_dir, "instruments_*.bin")))
+        for path in dumps[:max(0, len(dumps) - max(1, self.keep_days))]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+instrument_master = InstrumentMaster(
+    data_dir=os.getenv("INSTRUMENTS_DIR", "instruments"),
+    exchanges=tuple(os.getenv("INSTRUMENT_EXCHANGES", "NSE").split(","))
+)
+
+def main():
+    from execution_engine import ExecutionEngine
+    from strategy_engine import StrategyEngine
+
+    parser = argparse.ArgumentParser(description="Download or query the instrument master")
+    parser.add_argument("--download", action="store_true", help="fetch today's dump using the first active account")
+    parser.add_argument("--lookup", help="trading symbol to look up")
+    parser.add_argument("--exchange")
+    args = parser.parse_args()
+
+    kite = None
+    if args.download:
+        engine = ExecutionEngine(StrategyEngine())
+        accounts = engine.get_active_accounts()
+        if not accounts:
+            parser.error("no active account with an access token to download instruments with")
+        kite = engine.get_kite_client(accounts[0])
+    if not instrument_master.ensure_loaded(kite):
+        parser.error("no instrument dump available; run with --download")
+    print(f"[OK] Loaded {len(instrument_master):,} instruments for {instrument_master.loaded_date}")
+    if args.lookup:
+        print(instrument_master.get(args.lookup.upper(), args.exchange))
+
+if __name__ == "__main__":
+    main()
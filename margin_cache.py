@@ -0,0 +1,128 @@
+"""
+Margin cache - per-account margin snapshots kept fresh by a background thread
+Order sizing reads these from memory; broker calls happen only on the refresh thread
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from event_log import event_log
+from metrics import KITE_CALL_SECONDS, MARGIN_SNAPSHOTS_STALE
+from models import Account
+
+class MarginCache:
+    def __init__(self, client_factory: Callable[[Account], object], accounts: Callable[[], List[Account]],
+                 interval: float = 30.0, ttl: float = 90.0, fill_delay: float = 0.5, max_workers: int = 8):
+        self.client_factory = client_factory
+        self.accounts = accounts
+        self.interval = interval
+        self.ttl = ttl
+        # Fills arriving within this window share one refresh per account
+        self.fill_delay = fill_delay
+        self.max_workers = max_workers
+        self._snapshots: Dict[int, dict] = {}
+        self._dirty: Dict[int, Account] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        MARGIN_SNAPSHOTS_STALE.set_function(self.stale_count)
+
+    def get(self, account_id: int) -> Optional[dict]:
+        """Latest snapshot for an account with its age and a stale flag, or None"""
+        with self._lock:
+            snapshot = self._snapshots.get(account_id)
+        if snapshot is None:
+            return None
+        age = time.monotonic() - snapshot["fetched_monotonic"]
+        result = {k: v for k, v in snapshot.items() if k != "fetched_monotonic"}
+        result.update(age_seconds=round(age, 3), stale=age > self.ttl)
+        return result
+
+    def available_cash(self, account_id: int) -> Optional[float]:
+        """Margin available for new orders, or None when unknown or stale"""
+        snapshot = self.get(account_id)
+        if snapshot is None or snapshot["stale"]:
+            return None
+        return snapshot["net"]
+
+    def stale_count(self) -> int:
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            return sum(1 for s in self._snapshots.values() if s["fetched_monotonic"] < cutoff)
+
+    def snapshots(self) -> List[dict]:
+        with self._lock:
+            account_ids = list(self._snapshots)
+        return [self.get(account_id) for account_id in account_ids]
+
+    def request_refresh(self, account: Account):
+        """Ask the background thread to re-read an account's margins, e.g. after a fill"""
+        with self._lock:
+            self._dirty[account.id] = account
+        self._wakeup.set()
+
+    def refresh(self, accounts: List[Account]):
+        """Fetch margins for the given accounts concurrently"""
+        accounts = [a for a in accounts if a.access_token]
+        if not accounts:
+            return
+        if len(accounts) == 1:
+            self._refresh_one(accounts[0])
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(accounts)),
+                                thread_name_prefix="MarginCache-refresh") as pool:
+            list(pool.map(self._refresh_one, accounts))
+
+    def _refresh_one(self, account: Account):
+        try:
+            kite = self.client_factory(account)
+            with KITE_CALL_SECONDS.time(call="margins"):
+                equity = kite.margins("equity")
+        except Exception as e:
+            event_log.error("margin_refresh_failed", account_id=account.id, error=str(e))
+            return
+        snapshot = {
+            "account_id": account.id,
+            "available_cash": float(equity.get("available", {}).get("cash", 0) or 0),
+            "net": float(equity.get("net", 0) or 0),
+            "utilised": float(equity.get("utilised", {}).get("debits", 0) or 0),
+            "fetched_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "fetched_monotonic": time.monotonic()
+        }
+        with self._lock:
+            self._snapshots[account.id] = snapshot
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run_loop, name="MarginCache")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+
+    def _run_loop(self):
+        next_full = time.monotonic()
+        while self.running:
+            if time.monotonic() >= next_full:
+                with self._lock:
+                    self._dirty.clear()
+                self.refresh(self.accounts())
+                next_full = time.monotonic() + self.interval
+            else:
+                time.sleep(self.fill_delay)
+                with self._lock:
+                    dirty, self._dirty = list(self._dirty.values()), {}
+                self.refresh(dirty)
+
+            with self._lock:
+                pending = bool(self._dirty)
+            if not pending:
+                self._wakeup.wait(max(0.0, next_full - time.monotonic()))
+            self._wakeup.clear()
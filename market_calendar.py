@@ -0,0 +1,117 @@
+"""
+Market calendar - NSE session hours, weekends and exchange holidays
+Used by the strategy engine to align bars to the session open and idle while the market is closed
+"""
+
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Optional
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9: fall back to the server's local time
+    ZoneInfo = None
+
+TIMEFRAME_SECONDS = {"1m": 60, "3m": 180, "5m": 300, "10m": 600, "15m": 900, "30m": 1800,
+                     "1h": 3600, "1d": 86400}
+
+def timeframe_seconds(timeframe: str, default: int = 300) -> int:
+    """Bar length for a strategy timeframe such as '5m' or '1h'; raises ValueError for a zero length"""
+    timeframe = (timeframe or "").strip().lower()
+    if timeframe in TIMEFRAME_SECONDS:
+        return TIMEFRAME_SECONDS[timeframe]
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if timeframe[:-1].isdigit() and timeframe[-1:] in units:
+        seconds = int(timeframe[:-1]) * units[timeframe[-1]]
+        if seconds <= 0:
+            raise ValueError(f"timeframe {timeframe!r} has no length")
+        return seconds
+    return default
+
+def load_holidays(path: str) -> set:
+    """ISO dates, one per line; blank lines and # comments are ignored"""
+    if not path or not os.path.exists(path):
+        return set()
+    holidays = set()
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                holidays.add(date.fromisoformat(line))
+    return holidays
+
+class MarketCalendar:
+    def __init__(self, open_time: time = time(9, 15), close_time: time = time(15, 30),
+                 holidays: Iterable[date] = (), timezone: Optional[str] = "Asia/Kolkata",
+                 always_open: bool = False):
+        self.open_time = open_time
+        self.close_time = close_time
+        self.holidays = set(holidays)
+        self.tz = ZoneInfo(timezone) if timezone and ZoneInfo else None
+        # Treat every day as one midnight-to-midnight session (development against mock data)
+        self.always_open = always_open
+
+    def now(self) -> datetime:
+        """Current exchange time as a naive datetime"""
+        return datetime.now(self.tz).replace(tzinfo=None) if self.tz else datetime.now()
+
+    def is_trading_day(self, day: date) -> bool:
+        return self.always_open or (day.weekday() < 5 and day not in self.holidays)
+
+    def session(self, day: date):
+        """(open, close) datetimes for a trading day"""
+        if self.always_open:
+            start = datetime.combine(day, time(0))
+            return start, start + timedelta(days=1)
+        return datetime.combine(day, self.open_time), datetime.combine(day, self.close_time)
+
+    def is_open(self, moment: Optional[datetime] = None) -> bool:
+        moment = moment or self.now()
+        if not self.is_trading_day(moment.date()):
+            return False
+        session_open, session_close = self.session(moment.date())
+        return session_open <= moment < session_close
+
+    def next_open(self, moment: Optional[datetime] = None) -> datetime:
+        """Start of the current session if it is open, otherwise of the next one"""
+        moment = moment or self.now()
+        day = moment.date()
+        for _ in range(366):
+            if self.is_trading_day(day):
+                session_open, session_close = self.session(day)
+                if moment < session_close:
+                    return max(session_open, moment)
+            day += timedelta(days=1)
+        raise ValueError("no trading day within a year")
+
+    def next_bar(self, after: datetime, bar_seconds: int) -> datetime:
+        """First bar boundary strictly after `after`
+
+        Boundaries sit at session open + k * bar_seconds for k >= 1, so a 15m strategy
+        fires at 09:30, 09:45, ... once each bar has closed, regardless of when the
+        engine started. Bars too long to close within a session fire once, at the
+        open, when the previous one has closed.
+        """
+        if bar_seconds <= 0:
+            raise ValueError(f"bar length must be positive, got {bar_seconds}")
+        day = after.date()
+        for _ in range(366):
+            if self.is_trading_day(day):
+                session_open, session_close = self.session(day)
+                if after < session_open:
+                    first = session_open + timedelta(seconds=bar_seconds)
+                    return first if first < session_close else session_open
+                if after < session_close:
+                    elapsed = (after - session_open).total_seconds()
+                    boundary = session_open + timedelta(seconds=(int(elapsed // bar_seconds) + 1) * bar_seconds)
+                    if boundary < session_close:
+                        return boundary
+            day += timedelta(days=1)
+            after = datetime.combine(day, time(0)) - timedelta(microseconds=1)
+        raise ValueError("no trading day within a year")
+
+market_calendar = MarketCalendar(
+    holidays=load_holidays(os.getenv("MARKET_HOLIDAYS_FILE", "market_holidays.txt")),
+    timezone=os.getenv("MARKET_TZ", "Asia/Kolkata"),
+    always_open=os.getenv("MARKET_ALWAYS_OPEN") == "1"
+)
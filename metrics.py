@@ -0,0 +1,204 @@
+"""
+Prometheus-style metrics for the trading engines and web apps
+Updates go to per-thread shards so the hot path never takes a lock
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _format_labels(self, key: Tuple, extra: str = "") -> str:
+        pairs = [f'{n}="{v}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Sharded(_Metric):
+    """Each thread writes to its own dict; readers sum the shards"""
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._local = threading.local()
+        self._retired = {}
+        self._shards = [self._retired]
+        self._owners = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._retire_dead_shards()
+                self._owners.append((threading.current_thread(), shard))
+                self._shards = self._shards + [shard]
+        return shard
+
+    def _retire_dead_shards(self):
+        """Fold shards of finished threads (e.g. per-request web threads) into one"""
+        if len(self._owners) < 64:
+            return
+        alive = []
+        for thread, shard in self._owners:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                for key, value in shard.items():
+                    self._merge(self._retired, key, value)
+        self._owners = alive
+        self._shards = [self._retired] + [shard for _, shard in alive]
+
+    def _merge(self, target: Dict, key, value):
+        target[key] = target.get(key, 0) + value
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels) if labels else ()
+        shard[key] = shard.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = self._key(labels) if labels else ()
+        return sum(shard.get(key, 0) for shard in list(self._shards))
+
+    def samples(self):
+        totals = {}
+        for shard in list(self._shards):
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        for key, value in totals.items():
+            yield self.name + "_total", self._format_labels(key), value
+
+class Gauge(_Metric):
+    """Last-write-wins value, optionally computed at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}
+        self._function = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels) if labels else ()] = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels) if labels else (), 0)
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                self._values[()] = self._function()
+            except Exception:
+                pass
+        for key, value in list(self._values.items()):
+            yield self.name, self._format_labels(key), value
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels) if labels else ()
+        cell = shard.get(key)
+        if cell is None:
+            # [bucket counts..., +Inf count, sum]
+            cell = shard[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                cell[i] += 1
+                break
+        else:
+            cell[len(self.buckets)] += 1
+        cell[-1] += value
+
+    def _merge(self, target: Dict, key, value):
+        cell = target.setdefault(key, [0] * len(value))
+        for i, v in enumerate(value):
+            cell[i] += v
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        totals = {}
+        for shard in list(self._shards):
+            for key, cell in list(shard.items()):
+                total = totals.setdefault(key, [0] * len(cell))
+                for i, v in enumerate(cell):
+                    total[i] += v
+        for key, cell in totals.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), cell):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket", self._format_labels(key, f'le="{le}"'), cumulative
+            yield self.name + "_sum", self._format_labels(key), cell[-1]
+            yield self.name + "_count", self._format_labels(key), cumulative
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = MetricsRegistry()
+
+SIGNALS_GENERATED = registry.counter("trading_signals_generated", "Signals published by the strategy engine", ("strategy_id",))
+ORDERS_PLACED = registry.counter("trading_orders_placed", "Orders accepted by the broker", ("account_id",))
+ORDERS_REJECTED = registry.counter("trading_orders_rejected", "Order legs rejected by risk checks or the broker", ("reason",))
+SIGNAL_QUEUE_DEPTH = registry.gauge("trading_signal_queue_depth", "Signals waiting for the execution engine")
+ACTIVE_ACCOUNTS = registry.gauge("trading_active_accounts", "Accounts with ACTIVE status")
+ENGINE_LOOP_LAG = registry.gauge("trading_engine_loop_lag_seconds", "How late the last engine loop iteration started", ("engine",))
+DB_QUERY_SECONDS = registry.histogram("trading_db_query_seconds", "SQLite query time", ("query",))
+KITE_CALL_SECONDS = registry.histogram("trading_kite_call_seconds", "Kite Connect API call latency", ("call",))
+MARGIN_SNAPSHOTS_STALE = registry.gauge("trading_margin_snapshots_stale", "Accounts whose cached margins are older than the TTL")
@@ -0,0 +1,178 @@
+"""
+Mock Kite Login - a local stand-in for kite.zerodha.com's login pages
+Serves the same connect/login, api/login and api/twofa steps and redirects, so
+the HTTP login flow can be exercised offline. --check logs in against it once
+with good and bad credentials and exits non-zero if the flow misbehaves.
+
+Usage:
+    python mock_kite_login.py --port 5003
+    KITE_LOGIN_URL=http://127.0.0.1:5003 python session_manager.py --now
+    python mock_kite_login.py --check
+"""
+
+import argparse
+import json
+import secrets
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pyotp
+
+class MockLoginHandler(BaseHTTPRequestHandler):
+    server_version = "MockKiteLogin/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/connect/login":
+            session_id = self._session_id() or secrets.token_hex(8)
+            user_id = self.server.twofa_done.get(session_id)
+            if query.get("skip_session") and user_id:
+                # The real flow hops through /connect/finish before the app's redirect URL
+                self._redirect(f"/connect/finish?{urlencode({'sess_id': session_id})}")
+            else:
+                self._send(200, {"status": "success"}, cookie=session_id)
+        elif url.path == "/connect/finish":
+            session_id = query.get("sess_id", [""])[0]
+            if session_id not in self.server.twofa_done:
+                self._send(403, {"status": "error", "message": "Session not authorised"})
+                return
+            request_token = secrets.token_hex(16)
+            self.server.request_tokens[request_token] = self.server.twofa_done.pop(session_id)
+            self._redirect(f"{self.server.redirect_url}?{urlencode({'request_token': request_token, 'action': 'login', 'status': 'success'})}")
+        else:
+            self._send(404, {"status": "error", "message": f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        session_id = self._session_id()
+        if url.path == "/api/login":
+            user = self.server.users.get(form.get("user_id"))
+            if not session_id or user is None or user["password"] != form.get("password"):
+                self._send(403, {"status": "error", "message": "Invalid user ID or password"})
+                return
+            request_id = secrets.token_hex(8)
+            self.server.pending[request_id] = (session_id, form["user_id"])
+            self._send(200, {"status": "success", "data": {"user_id": form["user_id"], "request_id": request_id,
+                                                           "twofa_type": "totp"}})
+        elif url.path == "/api/twofa":
+            pending = self.server.pending.pop(form.get("request_id"), None)
+            if pending is None or pending != (session_id, form.get("user_id")):
+                self._send(403, {"status": "error", "message": "Invalid request ID"})
+                return
+            user = self.server.users[form["user_id"]]
+            if not pyotp.TOTP(user["totp_secret"]).verify(form.get("twofa_value", ""), valid_window=1):
+                self._send(403, {"status": "error", "message": "Invalid TOTP"})
+                return
+            self.server.twofa_done[session_id] = form["user_id"]
+            self._send(200, {"status": "success", "data": {}})
+        else:
+            self._send(404, {"status": "error", "message": f"Unknown path {url.path}"})
+
+    def _session_id(self):
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "kf_session":
+                return value
+        return None
+
+    def _redirect(self, location: str):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send(self, status: int, body: dict, cookie: str = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if cookie:
+            self.send_header("Set-Cookie", f"kf_session={cookie}; Path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class MockLoginServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5003,
+                 redirect_url: str = "http://127.0.0.1:9/callback"):
+        super().__init__((host, port), MockLoginHandler)
+        # The app's redirect URL; the login flow reads the token from it without fetching it
+        self.redirect_url = redirect_url
+        self.users = {}
+        self.pending = {}
+        self.twofa_done = {}
+        # request_token -> user_id, for checking what a login handed out
+        self.request_tokens = {}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_user(self, user_id: str, password: str, totp_secret: str = None) -> str:
+        """Register a login and return its TOTP secret"""
+        totp_secret = totp_secret or pyotp.random_base32()
+        self.users[user_id] = {"password": password, "totp_secret": totp_secret}
+        return totp_secret
+
+def check() -> bool:
+    """Run ZerodhaService.login_with_http against a throwaway mock server"""
+    from zerodha_service import ZerodhaService
+
+    server = MockLoginServer(port=0)
+    threading.Thread(target=server.serve_forever, name="MockKiteLogin", daemon=True).start()
+    totp_secret = server.add_user("AB1234", "secret")
+    service = ZerodhaService("mock_api_key", login_base_url=server.url)
+    cases = [
+        ("valid login", service.login_with_http("AB1234", "secret", totp_secret), True),
+        ("wrong password", service.login_with_http("AB1234", "wrong", totp_secret), False),
+        ("wrong TOTP", service.login_with_http("AB1234", "secret", pyotp.random_base32()), False),
+        ("unknown user", service.login_with_http("ZZ0000", "secret", totp_secret), False),
+    ]
+    server.shutdown()
+    server.server_close()
+
+    ok = True
+    for name, result, expect_success in cases:
+        passed = result["success"] == expect_success
+        if expect_success and passed:
+            passed = server.request_tokens.get(result["request_token"]) == "AB1234"
+        ok = ok and passed
+        print(f"[{'OK' if passed else 'FAIL'}] {name}: {result}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Kite login pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5003)
+    parser.add_argument("--user", action="append", default=[], metavar="USER_ID:PASSWORD[:TOTP_SECRET]",
+                        help="login to accept (default AB1234:secret)")
+    parser.add_argument("--check", action="store_true", help="test the HTTP login flow against the mock and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check() else 1)
+
+    server = MockLoginServer(args.host, args.port)
+    for spec in args.user or ["AB1234:secret"]:
+        user_id, password, *totp = spec.split(":")
+        print(f"{user_id}: TOTP secret {server.add_user(user_id, password, totp[0] if totp else None)}")
+    print(f"[OK] Mock Kite login on {server.url} (KITE_LOGIN_URL={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
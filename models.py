@@ -1,10 +1,26 @@
-from dataclasses import dataclass
-from typing import Optional, List
+from dataclasses import dataclass, field, fields
+from typing import Optional, List, Iterable
+from array import array
 from enum import Enum
 import sqlite3
 import json
+import sys
+import uuid
 from datetime import datetime
 
+def slotted(cls):
+    """Rebuild a dataclass with __slots__, like dataclass(slots=True) on Python 3.10+
+
+    Slotted instances have no per-instance __dict__, so they are smaller and faster
+    to create, which matters for objects made per row or per signal.
+    """
+    names = tuple(f.name for f in fields(cls))
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in names + ('__dict__', '__weakref__')}
+    namespace['__slots__'] = names
+    rebuilt = type(cls)(cls.__name__, cls.__bases__, namespace)
+    rebuilt.__qualname__ = cls.__qualname__
+    return rebuilt
+
 class BrokerType(Enum):
     ZERODHA = "ZERODHA"
 
@@ -12,6 +28,7 @@ class AccountStatus(Enum):
     ACTIVE = "ACTIVE"
     INACTIVE = "INACTIVE"
 
+@slotted
 @dataclass
 class Account:
     id: Optional[int] = None
@@ -32,6 +49,7 @@ class Strategy:
     parameters: str = "{}"
     is_active: bool = True
 
+@slotted
 @dataclass
 class AccountStrategy:
     id: Optional[int] = None
@@ -41,6 +59,7 @@ class AccountStrategy:
     max_risk_per_trade: float = 0.0
     is_enabled: bool = True
 
+@slotted
 @dataclass
 class Position:
     id: Optional[int] = None
@@ -52,6 +71,7 @@ class Position:
     pnl: float = 0.0
     created_at: str = ""
 
+@slotted
 @dataclass
 class Signal:
     strategy_id: int
@@ -59,6 +79,64 @@ class Signal:
     action: str  # BUY/SELL
     price: float
     timestamp: str
+    signal_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+
+class PositionColumns:
+    """Column-oriented position rows backed by typed arrays, for bulk reads
+
+    A million rows take a few dozen bytes each instead of a dict per row;
+    symbols are interned so repeated names share one string.
+    """
+    __slots__ = ('id', 'account_id', 'strategy_id', 'symbol', 'qty', 'entry_price', 'pnl', 'created_at')
+
+    def __init__(self):
+        self.id = array('q')
+        self.account_id = array('q')
+        self.strategy_id = array('q')
+        self.symbol = []
+        self.qty = array('q')
+        self.entry_price = array('d')
+        self.pnl = array('d')
+        self.created_at = []
+
+    def extend(self, rows: Iterable[tuple]):
+        """Append (id, account_id, strategy_id, symbol, qty, entry_price, pnl, created_at) rows"""
+        intern = sys.intern
+        for row in rows:
+            self.id.append(row[0])
+            self.account_id.append(row[1] or 0)
+            self.strategy_id.append(row[2] or 0)
+            self.symbol.append(intern(row[3] or ""))
+            self.qty.append(int(row[4] or 0))
+            self.entry_price.append(float(row[5] or 0))
+            self.pnl.append(float(row[6] or 0))
+            self.created_at.append(row[7] or "")
+
+    def __len__(self):
+        return len(self.id)
+
+    def truncate(self, length: int):
+        """Keep only the first `length` rows"""
+        for name in self.__slots__:
+            del getattr(self, name)[length:]
+
+    def __getitem__(self, index: int) -> Position:
+        return Position(self.id[index], self.account_id[index], self.strategy_id[index], self.symbol[index],
+                        self.qty[index], self.entry_price[index], self.pnl[index], self.created_at[index])
+
+    def total_pnl(self) -> float:
+        return sum(self.pnl)
+
+    def net_quantities(self) -> dict:
+        """Net quantity per (account_id, strategy_id, symbol)"""
+        net = {}
+        for key, qty in zip(zip(self.account_id, self.strategy_id, self.symbol), self.qty):
+            net[key] = net.get(key, 0) + qty
+        return net
+
+    def to_columns(self) -> dict:
+        """Plain lists per column, e.g. for a JSON response"""
+        return {name: list(getattr(self, name)) for name in self.__slots__}
 
 class Database:
     def __init__(self, db_path="trading.db"):
@@ -90,6 +168,35 @@ class Database:
         except sqlite3.OperationalError:
             pass  # Column already exists
         
+        # Stored login credentials, used to refresh access tokens before market open
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS account_credentials (
+                account_id INTEGER PRIMARY KEY,
+                api_secret TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                password TEXT NOT NULL,
+                totp_secret TEXT,
+                token_refreshed_at TIMESTAMP,
+                FOREIGN KEY (account_id) REFERENCES accounts (id)
+            )
+        ''')
+        
+        # One row per engine group; whichever process holds an unexpired lease runs the engines
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS engine_state (
+                name TEXT PRIMARY KEY,
+                owner TEXT,
+                host TEXT,
+                pid INTEGER,
+                running INTEGER NOT NULL DEFAULT 0,
+                stop_requested INTEGER NOT NULL DEFAULT 0,
+                started_at REAL,
+                heartbeat_at REAL,
+                lease_expires REAL NOT NULL DEFAULT 0,
+                url TEXT
+            )
+        ''')
+        
         # Strategies table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS strategies (
@@ -131,6 +238,127 @@ class Database:
             )
         ''')
         
+        # Indexes for filtered, keyset-paginated position queries
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_positions_account ON positions (account_id, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_positions_strategy ON positions (strategy_id, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_positions_symbol ON positions (symbol, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_positions_created ON positions (created_at)')
+        
+        # Kite order tag of the leg that filled a position, so journal recovery never books a fill twice
+        try:
+            cursor.execute('ALTER TABLE positions ADD COLUMN order_tag TEXT')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_positions_order_tag ON positions (order_tag) WHERE order_tag IS NOT NULL')
+        
+        # Running totals for positions, kept current by triggers so status
+        # summaries never have to scan the positions table. The backfills only
+        # run for new tables, and OR IGNORE keeps processes starting together safe.
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing_tables = {row[0] for row in cursor.fetchall()}
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS position_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_positions INTEGER NOT NULL DEFAULT 0,
+                total_pnl REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        if 'position_stats' not in existing_tables:
+            cursor.execute('''
+                INSERT OR IGNORE INTO position_stats (id, total_positions, total_pnl)
+                SELECT 1, COUNT(*), TOTAL(pnl) FROM positions
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS position_stats_insert AFTER INSERT ON positions
+            BEGIN
+                UPDATE position_stats SET total_positions = total_positions + 1,
+                    total_pnl = total_pnl + COALESCE(NEW.pnl, 0) WHERE id = 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS position_stats_delete AFTER DELETE ON positions
+            BEGIN
+                UPDATE position_stats SET total_positions = total_positions - 1,
+                    total_pnl = total_pnl - COALESCE(OLD.pnl, 0) WHERE id = 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS position_stats_update AFTER UPDATE OF pnl ON positions
+            BEGIN
+                UPDATE position_stats SET total_pnl = total_pnl - COALESCE(OLD.pnl, 0) + COALESCE(NEW.pnl, 0)
+                WHERE id = 1;
+            END
+        ''')
+        
+        # Monthly rollups of positions moved out to archive databases
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS position_rollups (
+                month TEXT NOT NULL,
+                account_id INTEGER NOT NULL,
+                strategy_id INTEGER NOT NULL,
+                symbol TEXT NOT NULL,
+                trades INTEGER NOT NULL DEFAULT 0,
+                net_qty INTEGER NOT NULL DEFAULT 0,
+                total_pnl REAL NOT NULL DEFAULT 0,
+                archive_path TEXT,
+                PRIMARY KEY (month, account_id, strategy_id, symbol)
+            )
+        ''')
+        
+        # Per account/strategy totals for summaries and P&L
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS position_totals (
+                account_id INTEGER NOT NULL,
+                strategy_id INTEGER NOT NULL,
+                total_positions INTEGER NOT NULL DEFAULT 0,
+                long_positions INTEGER NOT NULL DEFAULT 0,
+                short_positions INTEGER NOT NULL DEFAULT 0,
+                total_pnl REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (account_id, strategy_id)
+            )
+        ''')
+        if 'position_totals' not in existing_tables:
+            cursor.execute('''
+                INSERT OR IGNORE INTO position_totals
+                SELECT account_id, strategy_id, COUNT(*), TOTAL(qty > 0), TOTAL(qty < 0), TOTAL(pnl)
+                FROM positions GROUP BY account_id, strategy_id
+            ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS position_totals_insert AFTER INSERT ON positions
+            BEGIN
+                INSERT INTO position_totals (account_id, strategy_id, total_positions, long_positions,
+                    short_positions, total_pnl)
+                VALUES (NEW.account_id, NEW.strategy_id, 1, NEW.qty > 0, NEW.qty < 0, COALESCE(NEW.pnl, 0))
+                ON CONFLICT (account_id, strategy_id) DO UPDATE SET
+                    total_positions = total_positions + 1,
+                    long_positions = long_positions + excluded.long_positions,
+                    short_positions = short_positions + excluded.short_positions,
+                    total_pnl = total_pnl + excluded.total_pnl;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS position_totals_delete AFTER DELETE ON positions
+            BEGIN
+                UPDATE position_totals SET
+                    total_positions = total_positions - 1,
+                    long_positions = long_positions - (OLD.qty > 0),
+                    short_positions = short_positions - (OLD.qty < 0),
+                    total_pnl = total_pnl - COALESCE(OLD.pnl, 0)
+                WHERE account_id = OLD.account_id AND strategy_id = OLD.strategy_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS position_totals_update AFTER UPDATE OF qty, pnl ON positions
+            BEGIN
+                UPDATE position_totals SET
+                    long_positions = long_positions - (OLD.qty > 0) + (NEW.qty > 0),
+                    short_positions = short_positions - (OLD.qty < 0) + (NEW.qty < 0),
+                    total_pnl = total_pnl - COALESCE(OLD.pnl, 0) + COALESCE(NEW.pnl, 0)
+                WHERE account_id = OLD.account_id AND strategy_id = OLD.strategy_id;
+            END
+        ''')
+        
         conn.commit()
         conn.close()
     
@@ -0,0 +1,55 @@
+"""
+On-demand sampling profiler for the engine threads
+Produces collapsed stacks that flamegraph.pl / speedscope can read directly
+"""
+
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Iterable
+
+ENGINE_THREAD_NAMES = ("StrategyEngine", "ExecutionEngine")
+
+class SamplingProfiler:
+    def __init__(self, thread_names: Iterable[str] = ENGINE_THREAD_NAMES):
+        self.thread_names = tuple(thread_names)
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float = 10.0, interval: float = 0.005) -> str:
+        """Sample the engine threads for `seconds` and return collapsed stacks"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profiling session is already running")
+        try:
+            return self._collapse(self._sample(seconds, interval))
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float) -> Counter:
+        stacks = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()
+                     if t.name.startswith(self.thread_names)}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or ident not in names:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names[ident])
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return stacks
+
+    def _collapse(self, stacks: Counter) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+profiler = SamplingProfiler()
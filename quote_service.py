@@ -0,0 +1,135 @@
+"""
+Quote Service - batched, cached market quotes shared by the API and the strategy engine
+All symbols a caller needs go to the broker in one quote call; concurrent callers
+asking for the same symbols wait for that call instead of making their own
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from kiteconnect import KiteConnect
+
+from event_log import event_log
+from metrics import KITE_CALL_SECONDS
+from models import Database
+
+class QuoteService:
+    def __init__(self, client_factory: Callable[[], Optional[object]] = None, ttl: float = 0.5,
+                 exchange: str = "NSE", max_batch: int = 500):
+        # Returns an authenticated Kite client, or None to serve mock quotes
+        self.client_factory = client_factory or self._default_client
+        self.ttl = ttl
+        self.exchange = exchange
+        # Kite accepts at most 500 instruments per quote call
+        self.max_batch = max_batch
+        self._cache: Dict[str, tuple] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_checked = 0.0
+
+    def get_quote(self, symbol: str) -> dict:
+        return self.get_quotes([symbol])[symbol]
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, dict]:
+        """Quotes for every symbol, from cache when fresh and otherwise from one batched call"""
+        symbols = list(dict.fromkeys(symbols))
+        now = time.monotonic()
+        quotes, waiting, to_fetch = {}, {}, []
+        with self._lock:
+            for symbol in symbols:
+                cached = self._cache.get(symbol)
+                if cached and now - cached[0] <= self.ttl:
+                    quotes[symbol] = cached[1]
+                elif symbol in self._inflight:
+                    waiting[symbol] = self._inflight[symbol]
+                else:
+                    future = self._inflight[symbol] = Future()
+                    waiting[symbol] = future
+                    to_fetch.append(symbol)
+
+        if to_fetch:
+            self._fetch(to_fetch)
+        for symbol, future in waiting.items():
+            quotes[symbol] = future.result()
+        return quotes
+
+    def _fetch(self, symbols):
+        """Fetch quotes for symbols this caller owns and resolve their futures"""
+        try:
+            fetched = self._fetch_from_broker(symbols)
+        except Exception as e:
+            event_log.error("quote_fetch_failed", symbols=len(symbols), error=str(e))
+            fetched = {}
+        fetched_at = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                quote = fetched.get(symbol)
+                if quote is None:
+                    # Placeholders are never cached, so the next caller asks the broker again
+                    quote = self._mock_quote(symbol)
+                else:
+                    self._cache[symbol] = (fetched_at, quote)
+                self._inflight.pop(symbol).set_result(quote)
+
+    def _fetch_from_broker(self, symbols) -> Dict[str, dict]:
+        kite = self.client_factory()
+        if kite is None:
+            return {}
+        quotes = {}
+        for i in range(0, len(symbols), self.max_batch):
+            keys = [f"{self.exchange}:{symbol}" for symbol in symbols[i:i + self.max_batch]]
+            with KITE_CALL_SECONDS.time(call="quote"):
+                response = kite.quote(keys)
+            for key, data in response.items():
+                symbol = key.split(":", 1)[1]
+                close = data.get("ohlc", {}).get("close") or 0
+                ltp = data.get("last_price", 0)
+                change = ltp - close if close else 0.0
+                timestamp = data.get("timestamp") or datetime.now()
+                quotes[symbol] = {
+                    "symbol": symbol,
+                    "ltp": ltp,
+                    "change": round(change, 2),
+                    "change_percent": round(change / close * 100, 2) if close else 0.0,
+                    "volume": data.get("volume", 0),
+                    "timestamp": str(timestamp),
+                    "source": "kite"
+                }
+        return quotes
+
+    def _mock_quote(self, symbol: str) -> dict:
+        """Placeholder data for when no broker session is available"""
+        return {
+            "symbol": symbol,
+            "ltp": 2500.0,
+            "change": 25.0,
+            "change_percent": 1.0,
+            "volume": 1000000,
+            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "source": "mock"
+        }
+
+    def _default_client(self):
+        """Kite client of the first active account, re-checked once a minute"""
+        if time.monotonic() - self._client_checked < 60:
+            return self._client
+        self._client_checked = time.monotonic()
+        conn = Database().get_connection()
+        row = conn.execute("""
+            SELECT api_key, access_token FROM accounts
+            WHERE status = 'ACTIVE' AND access_token IS NOT NULL AND access_token != ''
+            ORDER BY id LIMIT 1
+        """).fetchone()
+        conn.close()
+        if row is None:
+            self._client = None
+        elif self._client is None or self._client.access_token != row[1]:
+            self._client = KiteConnect(api_key=row[0])
+            self._client.set_access_token(row[1])
+        return self._client
+
+quote_service = QuoteService()
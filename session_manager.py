@@ -0,0 +1,166 @@
+"""
+Session Manager - refresh every account's Kite access token before market open
+Logins run concurrently in a bounded pool; new tokens are written back to
+accounts and each account's Kite client is warmed with profile and margins calls
+
+Usage:
+    python session_manager.py --now
+    python session_manager.py --at 08:45 --workers 8
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from kiteconnect import KiteConnect
+
+from data_service import DataService
+from event_log import event_log
+from market_calendar import MarketCalendar, market_calendar
+from metrics import KITE_CALL_SECONDS
+from models import Account
+from zerodha_service import ZerodhaService
+
+class SessionManager:
+    def __init__(self, data_service: DataService = None, max_workers: int = 8, execution_engine=None,
+                 calendar: MarketCalendar = None):
+        self.data_service = data_service or DataService()
+        self.max_workers = max_workers
+        # When given, warm the engine's own cached clients instead of throwaway ones
+        self.execution_engine = execution_engine
+        self.calendar = calendar or market_calendar
+        self.last_run = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = None
+
+    def refresh_all(self, account_ids: Optional[List[int]] = None) -> dict:
+        """Log every account with stored credentials in again and warm its session"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A session refresh is already running")
+        try:
+            credentials = self.data_service.get_account_credentials(account_ids)
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(credentials))),
+                                    thread_name_prefix="SessionRefresh") as pool:
+                results = list(pool.map(self.refresh_account, credentials))
+            summary = {
+                "started_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "seconds": round(time.perf_counter() - started, 3),
+                "refreshed": sum(1 for r in results if r["success"]),
+                "failed": sum(1 for r in results if not r["success"]),
+                "accounts": results
+            }
+            event_log.log("sessions_refreshed", refreshed=summary["refreshed"], failed=summary["failed"],
+                          seconds=summary["seconds"])
+            self.last_run = summary
+            return summary
+        finally:
+            self._lock.release()
+
+    def refresh_account(self, credentials: dict) -> dict:
+        """Login, generate a session, persist the token and warm the client for one account"""
+        account_id = credentials["account_id"]
+        started = time.perf_counter()
+        result = {"account_id": account_id, "account_name": credentials["account_name"],
+                  "success": False, "error": None, "seconds": None}
+        try:
+            zerodha = ZerodhaService(credentials["api_key"])
+            with KITE_CALL_SECONDS.time(call="login"):
+                login = zerodha.login_with_credentials(credentials["user_id"], credentials["password"],
+                                                       credentials["totp_secret"])
+            if not login.get("success"):
+                raise RuntimeError(login.get("error") or login.get("message") or "login failed")
+
+            with KITE_CALL_SECONDS.time(call="generate_session"):
+                access_token = zerodha.generate_session(login["request_token"], credentials["api_secret"])
+            if not access_token:
+                raise RuntimeError("failed to generate access token")
+            self.data_service.update_access_token(account_id, access_token)
+
+            self.warm_up(Account(id=account_id, api_key=credentials["api_key"], access_token=access_token))
+            result["success"] = True
+        except Exception as e:
+            result["error"] = str(e)
+            event_log.error("session_refresh_failed", account_id=account_id, error=str(e))
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def warm_up(self, account: Account):
+        """Open the account's HTTP connection and prime the broker session before the first order"""
+        if self.execution_engine is not None:
+            kite = self.execution_engine.get_kite_client(account)
+        else:
+            kite = KiteConnect(api_key=account.api_key)
+            kite.set_access_token(account.access_token)
+        with KITE_CALL_SECONDS.time(call="profile"):
+            kite.profile()
+        with KITE_CALL_SECONDS.time(call="margins"):
+            kite.margins()
+
+    def start_daily(self, at: str = "08:45"):
+        """Refresh sessions at `at` (HH:MM exchange time) on every trading day in a background thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        # Each schedule gets its own stop event, so a stopped thread still sleeping cannot be revived
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run_daily, args=(at, self._stop), name="SessionManager")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop_daily(self):
+        if self._stop is not None:
+            self._stop.set()
+        self._thread = None
+
+    def _run_daily(self, at: str, stop: threading.Event):
+        while not stop.wait(max(0.0, (self.next_run(at) - self.calendar.now()).total_seconds())):
+            try:
+                self.refresh_all()
+            except Exception as e:
+                event_log.error("session_refresh_failed", error=str(e))
+
+    def next_run(self, at: str, now: Optional[datetime] = None) -> datetime:
+        """Next occurrence of HH:MM strictly after now on a trading day"""
+        now = now or self.calendar.now()
+        hour, minute = (int(part) for part in at.split(":"))
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run <= now:
+            run += timedelta(days=1)
+        for _ in range(366):
+            if self.calendar.is_trading_day(run.date()):
+                return run
+            run += timedelta(days=1)
+        raise ValueError("no trading day within a year")
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh Kite access tokens for all accounts")
+    parser.add_argument("--now", action="store_true", help="refresh once and exit")
+    parser.add_argument("--at", default="08:45", help="daily refresh time, HH:MM (default 08:45)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent logins")
+    parser.add_argument("--account-id", type=int, action="append", help="limit to these accounts")
+    args = parser.parse_args()
+
+    manager = SessionManager(max_workers=args.workers)
+    if args.now:
+        summary = manager.refresh_all(args.account_id)
+        print(f"[OK] Refreshed {summary['refreshed']} accounts, {summary['failed']} failed "
+              f"in {summary['seconds']}s")
+        for result in summary["accounts"]:
+            status = "OK" if result["success"] else f"FAILED: {result['error']}"
+            print(f"  {result['account_id']} {result['account_name']}: {status} ({result['seconds']}s)")
+        return
+
+    print(f"Refreshing sessions every trading day at {args.at}, next run {manager.next_run(args.at)}")
+    manager.start_daily(args.at)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Signal journal - append-only write-ahead log of signals and order legs
+A writer thread batches records and fsyncs once per batch (group commit), so many
+threads can wait for durability without paying an fsync each. On restart the
+journal tells the execution engine which legs never reached a final state.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from typing import List, Tuple
+
+from event_log import event_log
+from models import Signal
+
+# Leg states after which a leg needs no recovery
+FINAL_STATES = {"PLACED", "FAILED", "REJECTED", "SKIPPED", "NETTED", "ABANDONED"}
+
+class JournalError(RuntimeError):
+    """A durable journal write failed or was not on disk in time; nothing may be sent"""
+
+def new_leg_id() -> str:
+    """Unique id that doubles as the Kite order tag (alphanumeric, at most 20 chars)"""
+    return uuid.uuid4().hex[:20]
+
+class SignalJournal:
+    def __init__(self, path: str = "journal/signals.jsonl", enabled: bool = True, durable_timeout: float = 10.0):
+        self.path = path
+        self.enabled = enabled
+        # How long a durable write may wait for its fsync before JournalError is raised
+        self.durable_timeout = durable_timeout
+        self._queue = queue.SimpleQueue()
+        self._synced = threading.Condition()
+        self._next_seq = 0
+        self._synced_seq = 0
+        # seq -> error for durable records whose batch could not be written
+        self._failed = {}
+        # A failed write may have left half a line; the next write starts on a fresh one
+        self._torn = False
+        self._seq_lock = threading.Lock()
+        self._file = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        # Signal and leg ids this process is still working on; pending() leaves them out
+        self._live = set()
+        self._live_lock = threading.Lock()
+
+    def record_signal(self, signal: Signal):
+        self.claim([signal.signal_id])
+        self._append({"type": "signal", "signal": asdict(signal)})
+
+    def signals_dispatched(self, signal_ids: List[str], status: str = "DISPATCHED"):
+        if signal_ids:
+            self._release(signal_ids)
+            self._append({"type": "dispatched", "signal_ids": list(signal_ids), "status": status})
+
+    def legs_started(self, legs: List[dict]):
+        """Durably record legs before any of them is sent to the broker
+
+        Each leg holds leg_id, account_id, symbol, action, qty and allocations:
+        [{"signal": <Signal fields>, "qty": n}] to rebuild positions from.
+        Raises JournalError if the legs are not on disk.
+        """
+        if legs:
+            self.claim([leg["leg_id"] for leg in legs])
+            self._append({"type": "legs", "legs": legs}, durable=True)
+
+    def leg_finished(self, leg_id: str, status: str, order_id: str = None, error: str = None):
+        # Not waited on: recovery can still settle the leg from the broker's order tags
+        if status in FINAL_STATES:
+            self._release([leg_id])
+        self._append({"type": "leg", "leg_id": leg_id, "status": status, "order_id": order_id, "error": error})
+
+    def claim(self, ids: List[str]):
+        """Mark signal or leg ids as handled by this process, e.g. signals re-queued by recovery"""
+        with self._live_lock:
+            self._live.update(ids)
+
+    def _release(self, ids: List[str]):
+        with self._live_lock:
+            self._live.difference_update(ids)
+
+    def pending(self) -> Tuple[List[dict], List[dict]]:
+        """(signals never dispatched, legs without a final state), oldest first
+
+        Left out are those this process journaled or re-queued and has not
+        finished: they are still queued or in flight here, so recovering them
+        would send them twice.
+        """
+        self.flush()
+        signals, legs = self._scan()
+        with self._live_lock:
+            live = set(self._live)
+        return ([r for r in signals if r["signal"]["signal_id"] not in live],
+                [leg for leg in legs if leg["leg_id"] not in live])
+
+    def _scan(self) -> Tuple[List[dict], List[dict]]:
+        signals, legs = {}, {}
+        if not os.path.exists(self.path):
+            return [], []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash mid-write
+                kind = record.get("type")
+                if kind == "signal":
+                    signals[record["signal"]["signal_id"]] = record
+                elif kind == "dispatched":
+                    for signal_id in record["signal_ids"]:
+                        signals.pop(signal_id, None)
+                elif kind == "legs":
+                    for leg in record["legs"]:
+                        legs[leg["leg_id"]] = dict(leg, journaled_at=record["ts"])
+                        # A signal whose legs were journaled is recovered through those legs
+                        for allocation in leg["allocations"]:
+                            signals.pop(allocation["signal"]["signal_id"], None)
+                elif kind == "leg" and record["status"] in FINAL_STATES:
+                    legs.pop(record["leg_id"], None)
+        return list(signals.values()), list(legs.values())
+
+    def compact(self):
+        """Rewrite the journal keeping only records that still matter
+
+        Meant for startup, after recovery. The writer cannot append while the
+        journal is read and rewritten, so records queued meanwhile land in the
+        new file instead of being lost with the old one.
+        """
+        self.flush()
+        with self._thread_lock:
+            signals, legs = self._scan()
+            if not signals and not legs and not os.path.exists(self.path):
+                return
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in signals:
+                    f.write(json.dumps(record, default=str) + "\n")
+                for leg in legs:
+                    ts = leg.pop("journaled_at")
+                    f.write(json.dumps({"type": "legs", "ts": ts, "legs": [leg]}, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._torn = False
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until everything appended so far is on disk"""
+        with self._seq_lock:
+            seq = self._next_seq
+        self._wait(seq, timeout)
+
+    def _append(self, record: dict, durable: bool = False):
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        record["ts"] = time.time()
+        with self._seq_lock:
+            self._next_seq += 1
+            seq = self._next_seq
+            self._queue.put((seq, json.dumps(record, default=str), durable))
+        if durable:
+            self._wait(seq, self.durable_timeout, durable=True)
+
+    def _wait(self, seq: int, timeout: float = None, durable: bool = False):
+        with self._synced:
+            synced = self._synced.wait_for(lambda: self._synced_seq >= seq, timeout)
+            error = self._failed.pop(seq, None) if durable else None
+        if durable and not synced:
+            raise JournalError(f"journal write not on disk after {timeout}s")
+        if durable and error:
+            raise JournalError(f"journal write failed: {error}")
+
+    def _ensure_writer(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._thread = threading.Thread(target=self._run_writer, name="SignalJournalWriter")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run_writer(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            error = None
+            try:
+                with self._thread_lock:
+                    if self._file is None:
+                        self._file = open(self.path, "a", encoding="utf-8")
+                    self._file.write(("\n" if self._torn else "") + "".join(line + "\n" for _, line, _ in batch))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._torn = False
+            except Exception as e:
+                # Waiters must hear about it, and the writer must live on for the next batch
+                error = str(e)
+                event_log.error("journal_write_failed", records=len(batch), error=error)
+                with self._thread_lock:
+                    self._torn = True
+                    if self._file is not None:
+                        try:
+                            self._file.close()
+                        except OSError:
+                            pass
+                        self._file = None
+            with self._synced:
+                if error:
+                    self._failed.update((seq, error) for seq, _, durable in batch if durable)
+                self._synced_seq = max(self._synced_seq, batch[-1][0])
+                self._synced.notify_all()
+
+signal_journal = SignalJournal(
+    path=os.getenv("SIGNAL_JOURNAL_PATH", "journal/signals.jsonl"),
+    enabled=os.getenv("SIGNAL_JOURNAL", "1") != "0"
+)
@@ -0,0 +1,79 @@
+"""
+Signal tickets - run signal fan-out in the background and let API clients
+poll or long-poll for per-leg results
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+class SignalTicketStore:
+    def __init__(self, max_workers: int = 8, max_tickets: int = 10000):
+        self.max_tickets = max_tickets
+        self._tickets = OrderedDict()
+        self._changed = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="SignalTicket")
+
+    def submit(self, run: Callable[[Callable[[dict], None]], List[dict]], **details) -> dict:
+        """Queue `run(on_leg)` and return its ticket immediately"""
+        ticket = {
+            "ticket_id": uuid.uuid4().hex[:16],
+            "status": "QUEUED",
+            "legs": [],
+            "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "completed_at": None,
+            "error": None
+        }
+        ticket.update(details)
+        with self._changed:
+            self._tickets[ticket["ticket_id"]] = ticket
+            while len(self._tickets) > self.max_tickets:
+                self._tickets.popitem(last=False)
+            snapshot = self._snapshot(ticket)
+        self._pool.submit(self._run, ticket, run)
+        return snapshot
+
+    def get(self, ticket_id: str, wait: float = 0, seen_legs: int = 0) -> Optional[dict]:
+        """Return a ticket, optionally waiting up to `wait` seconds for news
+
+        A waiting caller returns as soon as the ticket finishes or has more than
+        `seen_legs` leg results, so clients can subscribe by long-polling.
+        """
+        deadline = time.monotonic() + wait
+        with self._changed:
+            ticket = self._tickets.get(ticket_id)
+            while (ticket is not None and ticket["status"] in ("QUEUED", "RUNNING")
+                   and len(ticket["legs"]) <= seen_legs):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return self._snapshot(ticket) if ticket else None
+
+    def _run(self, ticket: dict, run: Callable):
+        self._update(ticket, status="RUNNING")
+        try:
+            run(lambda leg: self._add_leg(ticket, leg))
+            self._update(ticket, status="COMPLETED")
+        except Exception as e:
+            self._update(ticket, status="FAILED", error=str(e))
+
+    def _add_leg(self, ticket: dict, leg: dict):
+        with self._changed:
+            ticket["legs"].append(leg)
+            self._changed.notify_all()
+
+    def _update(self, ticket: dict, **fields):
+        with self._changed:
+            ticket.update(fields)
+            if fields.get("status") in ("COMPLETED", "FAILED"):
+                ticket["completed_at"] = time.strftime('%Y-%m-%d %H:%M:%S')
+            self._changed.notify_all()
+
+    def _snapshot(self, ticket: dict) -> dict:
+        snapshot = dict(ticket)
+        snapshot["legs"] = list(ticket["legs"])
+        return snapshot
@@ -0,0 +1,103 @@
+"""
+Server-sent events broadcaster for dashboard status and P&L
+One producer thread polls the data sources and fans changes out to every client
+"""
+
+import json
+import queue
+import threading
+import time
+from typing import Callable, Dict
+
+from event_log import event_log
+
+class StatusBroadcaster:
+    def __init__(self, sources: Dict[str, Callable[[], dict]], interval: float = 2.0,
+                 heartbeat: float = 15.0, client_buffer: int = 100):
+        self.sources = sources
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.client_buffer = client_buffer
+        self.snapshot = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self) -> queue.Queue:
+        """Register a client; it first receives the full current snapshot"""
+        client = queue.Queue(maxsize=self.client_buffer)
+        with self._lock:
+            for name, data in self.snapshot.items():
+                client.put_nowait((name, data))
+            self._subscribers.add(client)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_producer, name="StatusBroadcaster")
+                self._thread.daemon = True
+                self._thread.start()
+        return client
+
+    def unsubscribe(self, client: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(client)
+
+    def stream(self):
+        """Generator of SSE frames for one client, suitable for a Flask Response"""
+        client = self.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    name, data = client.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if name is None:
+                    return
+                yield f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            self.unsubscribe(client)
+
+    def _publish(self, name: str, data: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for client in subscribers:
+            try:
+                client.put_nowait((name, data))
+            except queue.Full:
+                # Slow client: drop it, the browser's EventSource will reconnect
+                self.unsubscribe(client)
+                try:
+                    client.get_nowait()
+                    client.put_nowait((None, None))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _run_producer(self):
+        """Poll each source once per interval and publish only what changed"""
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+
+            for name, source in self.sources.items():
+                try:
+                    current = source()
+                except Exception as e:
+                    event_log.error("status_source_failed", source=name, error=str(e))
+                    continue
+                delta = self._diff(self.snapshot.get(name), current)
+                if delta:
+                    with self._lock:
+                        self.snapshot[name] = current
+                    self._publish(name, delta)
+
+            time.sleep(self.interval)
+
+    def _diff(self, previous: dict, current: dict) -> dict:
+        """Top-level keys whose values changed (None means the key was removed)"""
+        if previous is None:
+            return current
+        delta = {k: v for k, v in current.items() if previous.get(k) != v}
+        delta.update({k: None for k in previous if k not in current})
+        return delta
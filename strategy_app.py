@@ -1,7 +1,11 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify
 from models import Account, Strategy, AccountStrategy
 from data_service import DataService
-from backend_api import TradingSystemAPI
+from backend_api import create_trading_api
+from engine_server import EngineUnavailable
+from status_stream import StatusBroadcaster
+from export_service import ExportService, FORMATS
+from metrics import registry, PROMETHEUS_CONTENT_TYPE
 import json
 
 app = Flask(__name__)
@@ -17,24 +21,24 @@ def from_json_filter(value):
 
 # Initialize services
 data_service = DataService()
-trading_api = TradingSystemAPI()
-
-# Global engine state
-engines_running = False
+trading_api = create_trading_api()
+export_service = ExportService(data_service)
 
 @app.route('/')
 def dashboard():
     accounts = data_service.get_accounts()
     strategies = data_service.get_strategies()
     mappings = data_service.get_account_strategies()
-    positions = data_service.get_positions()
+    positions = data_service.get_positions_page(limit=10)['positions']
+    position_count = data_service.get_status_summary()['total_positions']
     
     return render_template('strategy_dashboard.html', 
                          accounts=accounts, 
                          strategies=strategies,
                          mappings=mappings,
                          positions=positions,
-                         engines_running=engines_running)
+                         position_count=position_count,
+                         engines_running=trading_api.get_engine_state()['running'])
 
 # Account Management
 @app.route('/accounts')
@@ -257,62 +261,148 @@ def delete_mapping(mapping_id):
     return redirect(url_for('mappings'))
 
 # Positions
+def _position_filter_args():
+    """Read position filters from the query string"""
+    return {
+        'account_id': request.args.get('account_id', type=int),
+        'strategy_id': request.args.get('strategy_id', type=int),
+        'symbol': request.args.get('symbol', '').strip() or None,
+        'date_from': request.args.get('date_from') or None,
+        'date_to': request.args.get('date_to') or None
+    }
+
 @app.route('/positions')
 def positions():
-    positions = data_service.get_positions()
-    return render_template('positions.html', positions=positions)
+    filters = _position_filter_args()
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    page = data_service.get_positions_page(limit=limit, cursor=request.args.get('cursor', type=int), **filters)
+    summary = data_service.get_positions_summary(**filters)
+    
+    next_url = None
+    if page['next_cursor'] is not None:
+        args = {k: v for k, v in request.args.items() if k != 'cursor'}
+        next_url = url_for('positions', cursor=page['next_cursor'], **args)
+    
+    return render_template('positions.html',
+                         positions=page['positions'],
+                         summary=summary,
+                         filters=filters,
+                         next_url=next_url,
+                         export_args={k: v for k, v in request.args.items() if k not in ('format', 'cursor')},
+                         accounts=data_service.get_accounts(),
+                         strategies=data_service.get_strategies())
+
+@app.route('/api/positions')
+def api_positions():
+    if request.args.get('format') == 'columns':
+        # Parallel arrays are far smaller than one object per row, so pages can be larger
+        limit = max(1, min(request.args.get('limit', 1000, type=int), 10000))
+        page = data_service.get_position_columns_page(limit=limit, cursor=request.args.get('cursor', type=int),
+                                                      **_position_filter_args())
+        return jsonify({'columns': page['columns'].to_columns(), 'next_cursor': page['next_cursor']})
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify(data_service.get_positions_page(limit=limit, cursor=request.args.get('cursor', type=int),
+                                                   **_position_filter_args()))
+
+@app.route('/positions/export')
+def export_positions():
+    return export_data('positions')
+
+@app.route('/export/<dataset>')
+def export_data(dataset):
+    export_format = request.args.get('format', 'csv')
+    filters = _position_filter_args()
+    if dataset == 'pnl':
+        filters = {'account_id': filters['account_id'], 'strategy_id': filters['strategy_id']}
+    try:
+        stream = export_service.stream(dataset, export_format, **filters)
+    except (ValueError, RuntimeError) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    mimetype, extension = FORMATS[export_format]
+    return Response(stream, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={dataset}.{extension}'})
 
 # Engine Control
 @app.route('/engines/start')
 def start_engines():
-    global engines_running
-    if not engines_running:
-        result = trading_api.start_system()
-        if result['status'] == 'success':
-            engines_running = True
-            flash('Trading engines started!', 'success')
-        else:
-            flash(f'Error: {result["message"]}', 'error')
-    else:
+    if trading_api.get_engine_state()['running']:
         flash('Engines are already running!', 'warning')
+        return redirect(url_for('dashboard'))
+    result = trading_api.start_system()
+    if result['status'] == 'success':
+        flash('Trading engines started!', 'success')
+    else:
+        flash(f'Error: {result["message"]}', 'error')
     return redirect(url_for('dashboard'))
 
 @app.route('/engines/stop')
 def stop_engines():
-    global engines_running
-    if engines_running:
-        result = trading_api.stop_system()
-        if result['status'] == 'success':
-            engines_running = False
-            flash('Trading engines stopped!', 'success')
-        else:
-            flash(f'Error: {result["message"]}', 'error')
-    else:
+    if not trading_api.get_engine_state()['running']:
         flash('Engines are not running!', 'warning')
+        return redirect(url_for('dashboard'))
+    result = trading_api.stop_system()
+    if result['status'] == 'success':
+        flash(f'{result["message"]}!', 'success')
+    else:
+        flash(f'Error: {result["message"]}', 'error')
     return redirect(url_for('dashboard'))
 
 # API endpoints for real-time updates
-@app.route('/api/status')
-def api_status():
-    system_status = trading_api.get_system_status()
-    return jsonify({
+def _status_payload():
+    system_status = trading_api.get_status_summary()
+    return {
         'engines_running': system_status['system_running'],
         'active_strategies': system_status['active_strategies'],
         'active_accounts': system_status['active_accounts'],
         'total_positions': system_status['total_positions']
-    })
+    }
+
+def _pnl_payload():
+    account_pnl = trading_api.get_real_time_pnl()['account_pnl']
+    return {str(account_id): pnl for account_id, pnl in account_pnl.items()}
+
+# Single producer shared by every open dashboard tab
+status_broadcaster = StatusBroadcaster({'status': _status_payload, 'pnl': _pnl_payload})
+
+@app.route('/api/status')
+def api_status():
+    return jsonify(_status_payload())
+
+@app.route('/api/stream')
+def api_stream():
+    return Response(status_broadcaster.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/pnl')
 def api_pnl():
     return jsonify(trading_api.get_real_time_pnl())
 
+@app.route('/api/logs')
+def api_logs():
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({'events': trading_api.get_logs(limit, request.args.get('level'))})
+
+@app.route('/api/admin/profile', methods=['POST'])
+def api_profile():
+    seconds = min(request.args.get('seconds', 10, type=float), 120)
+    interval = request.args.get('interval_ms', 5, type=float) / 1000
+    try:
+        collapsed = trading_api.profile_engines(seconds, interval)
+    except EngineUnavailable as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    return Response(collapsed, mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename=engine-profile.collapsed'})
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/api/emergency-stop', methods=['POST'])
 def api_emergency_stop():
-    result = trading_api.emergency_stop()
-    global engines_running
-    if result['status'] == 'success':
-        engines_running = False
-    return jsonify(result)
+    return jsonify(trading_api.emergency_stop())
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
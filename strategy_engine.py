@@ -1,27 +1,75 @@
+import heapq
 import threading
 import time
-from typing import List, Dict
+from types import MappingProxyType
+from typing import Iterable, List, Dict, Mapping, Optional
 from models import Database, Strategy, Signal, Account
 from datetime import datetime
+from market_calendar import market_calendar, timeframe_seconds
+from event_log import event_log
+from metrics import DB_QUERY_SECONDS, SIGNALS_GENERATED, ENGINE_LOOP_LAG
+from quote_service import quote_service
+from signal_journal import signal_journal
 import json
+import os
 
 class StrategyEngine:
-    def __init__(self):
+    def __init__(self, quotes=None, calendar=None, reload_interval: float = 30.0, allow_mock_quotes: bool = None):
         self.db = Database()
         self.running = False
+        self.thread = None
         self.signals = []
+        self.quotes = quotes or quote_service
+        self.calendar = calendar or market_calendar
+        # Placeholder quotes only drive strategies when asked for (development against mock data)
+        self.allow_mock_quotes = (os.getenv("ALLOW_MOCK_QUOTES") == "1" if allow_mock_quotes is None
+                                  else allow_mock_quotes)
+        # How often strategy definitions are re-read while waiting for the next bar
+        self.reload_interval = reload_interval
+        self._wakeup = threading.Event()
+        # Heap of (due, strategy_id); _scheduled holds the due time and timeframe per strategy
+        self._schedule = []
+        self._scheduled = {}
+        self._strategies = {}
+        # Subscription index: symbol -> strategy ids trading it, and each strategy's symbol
+        self.subscriptions: Dict[str, set] = {}
+        self._symbols: Dict[int, str] = {}
         
-    def fetch_market_data(self, strategy: Strategy) -> Dict:
-        """Fetch market data for strategy - placeholder implementation"""
-        # In real implementation, this would fetch from Zerodha API
-        return {
-            "symbol": "RELIANCE",
-            "price": 2500.0,
-            "volume": 1000,
-            "timestamp": datetime.now().isoformat()
-        }
+    @staticmethod
+    def strategy_symbol(strategy: Strategy) -> str:
+        """Symbol a strategy trades (parameter "symbol", default RELIANCE); ValueError if unreadable"""
+        params = json.loads(strategy.parameters)
+        if not isinstance(params, dict):
+            raise ValueError(f"parameters must be a JSON object, got {type(params).__name__}")
+        symbol = params.get("symbol", "RELIANCE")
+        if not isinstance(symbol, str) or not symbol:
+            raise ValueError(f"symbol must be a non-empty string, got {symbol!r}")
+        return symbol.upper()
+    
+    def fetch_market_data(self, strategy: Strategy) -> Optional[Mapping]:
+        """Fetch market data for a single strategy's symbol; None without a live quote"""
+        symbol = self._symbols.get(strategy.id) or self.strategy_symbol(strategy)
+        return self.market_snapshots([symbol]).get(symbol)
+    
+    def market_snapshots(self, symbols: Iterable[str]) -> Dict[str, Mapping]:
+        """One read-only snapshot per symbol, fetched in a single quote call and shared by every subscriber
+
+        Symbols without a live broker quote are left out, so no strategy trades on placeholder prices.
+        """
+        quotes = self.quotes.get_quotes(symbols)
+        timestamp = datetime.now().isoformat()
+        skipped = [symbol for symbol, quote in quotes.items() if quote.get("source") != "kite"]
+        if skipped and not self.allow_mock_quotes:
+            event_log.log("quotes_unavailable", level="WARNING", symbols=len(skipped), sample=skipped[:5])
+            quotes = {symbol: quote for symbol, quote in quotes.items() if quote.get("source") == "kite"}
+        return {symbol: MappingProxyType({
+            "symbol": symbol,
+            "price": quote["ltp"],
+            "volume": quote["volume"],
+            "timestamp": timestamp
+        }) for symbol, quote in quotes.items()}
     
-    def run_strategy(self, strategy: Strategy, data: Dict) -> Signal:
+    def run_strategy(self, strategy: Strategy, data: Mapping) -> Signal:
         """Run strategy logic - placeholder implementation"""
         # Simple moving average crossover strategy example
         params = json.loads(strategy.parameters)
@@ -47,11 +95,12 @@ class StrategyEngine:
     
     def get_active_strategies(self) -> List[Strategy]:
         """Get all active strategies from database"""
-        conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM strategies WHERE is_active = 1")
-        rows = cursor.fetchall()
-        conn.close()
+        with DB_QUERY_SECONDS.time(query="get_active_strategies"):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM strategies WHERE is_active = 1")
+            rows = cursor.fetchall()
+            conn.close()
         
         strategies = []
         for row in rows:
@@ -67,43 +116,133 @@ class StrategyEngine:
     
     def publish_signal(self, signal: Signal):
         """Publish signal to execution engine"""
+        signal_journal.record_signal(signal)
         self.signals.append(signal)
-        print(f"Signal published: {signal.action} {signal.symbol} at {signal.price}")
+        SIGNALS_GENERATED.inc(strategy_id=signal.strategy_id)
+        event_log.log("signal_published", signal_id=signal.signal_id, strategy_id=signal.strategy_id,
+                      symbol=signal.symbol, action=signal.action, price=signal.price)
     
     def start(self):
         """Start the strategy engine"""
         self.running = True
-        thread = threading.Thread(target=self._run_loop)
-        thread.daemon = True
-        thread.start()
-        print("Strategy Engine started")
+        self._wakeup.clear()
+        self.thread = threading.Thread(target=self._run_loop, name="StrategyEngine")
+        self.thread.daemon = True
+        self.thread.start()
+        event_log.log("engine_started", engine="strategy")
     
     def stop(self):
         """Stop the strategy engine"""
         self.running = False
-        print("Strategy Engine stopped")
+        self._wakeup.set()
+        event_log.log("engine_stopped", engine="strategy")
+    
+    def reload_strategies(self, now: datetime = None):
+        """Sync the schedule with the active strategies, keeping due times of unchanged ones"""
+        now = now or self.calendar.now()
+        self._strategies = {s.id: s for s in self.get_active_strategies()}
+        symbols, subscriptions, bars = {}, {}, {}
+        for strategy in self._strategies.values():
+            # One strategy with bad settings is skipped; it must not stop the others from loading
+            try:
+                symbol = self.strategy_symbol(strategy)
+                bars[strategy.id] = timeframe_seconds(strategy.timeframe)
+            except Exception as e:
+                event_log.error("strategy_parameters_invalid", strategy_id=strategy.id, error=str(e))
+                continue
+            symbols[strategy.id] = symbol
+            subscriptions.setdefault(symbol, set()).add(strategy.id)
+        self._symbols, self.subscriptions = symbols, subscriptions
+        for strategy_id in list(self._scheduled):
+            if strategy_id not in symbols:
+                del self._scheduled[strategy_id]
+        for strategy in self._strategies.values():
+            if strategy.id not in symbols:
+                continue
+            bar_seconds = bars[strategy.id]
+            current = self._scheduled.get(strategy.id)
+            if current is None or current[1] != bar_seconds:
+                due = self.calendar.next_bar(now, bar_seconds)
+                self._scheduled[strategy.id] = (due, bar_seconds)
+                heapq.heappush(self._schedule, (due, strategy.id))
+    
+    def next_due(self):
+        """Earliest live schedule entry, discarding ones superseded by a reload"""
+        while self._schedule:
+            due, strategy_id = self._schedule[0]
+            current = self._scheduled.get(strategy_id)
+            if current is not None and current[0] == due:
+                return due
+            heapq.heappop(self._schedule)
+        return None
+    
+    def run_due(self, now: datetime) -> int:
+        """Evaluate every strategy whose bar closed by `now` and schedule its next bar
+
+        Due strategies are grouped by symbol so each symbol is fetched once per
+        cycle, however many strategies subscribe to it.
+        """
+        due_by_symbol = {}
+        while self.next_due() is not None and self._schedule[0][0] <= now:
+            due, strategy_id = heapq.heappop(self._schedule)
+            bar_seconds = self._scheduled[strategy_id][1]
+            # Next boundary after the later of due and now: a stalled engine skips missed bars
+            # instead of replaying them, and timing error never accumulates
+            next_due = self.calendar.next_bar(max(due, now), bar_seconds)
+            self._scheduled[strategy_id] = (next_due, bar_seconds)
+            heapq.heappush(self._schedule, (next_due, strategy_id))
+            if not self.calendar.is_open(now):
+                # Woke up after the close: no orders can go out, wait for the next session
+                continue
+            due_by_symbol.setdefault(self._symbols[strategy_id], []).append(strategy_id)
+        
+        if not due_by_symbol:
+            return 0
+        snapshots = self.market_snapshots(due_by_symbol)
+        evaluated = 0
+        for symbol, strategy_ids in due_by_symbol.items():
+            data = snapshots.get(symbol)
+            if data is None:
+                # No live quote this bar; the strategies run again at their next one
+                continue
+            for strategy_id in strategy_ids:
+                try:
+                    signal = self.run_strategy(self._strategies[strategy_id], data)
+                    if signal:
+                        self.publish_signal(signal)
+                except Exception as e:
+                    event_log.error("strategy_failed", strategy_id=strategy_id, error=str(e))
+                evaluated += 1
+        return evaluated
     
     def _run_loop(self):
-        """Main strategy execution loop"""
+        """Fire each strategy at its own bar boundaries, idling between them and outside the session"""
+        next_reload = 0.0
         while self.running:
             try:
-                active_strategies = self.get_active_strategies()
+                if time.monotonic() >= next_reload:
+                    self.reload_strategies()
+                    next_reload = time.monotonic() + self.reload_interval
                 
-                for strategy in active_strategies:
-                    data = self.fetch_market_data(strategy)
-                    signal = self.run_strategy(strategy, data)
-                    
-                    if signal:
-                        self.publish_signal(signal)
+                due = self.next_due()
+                now = self.calendar.now()
+                if due is not None and due <= now:
+                    ENGINE_LOOP_LAG.set((now - due).total_seconds(), engine="strategy")
+                    self.run_due(now)
+                    continue
                 
-                time.sleep(5)  # Run every 5 seconds
+                # Sleep until the next bar or the next reload, whichever is first
+                wait = next_reload - time.monotonic()
+                if due is not None:
+                    wait = min(wait, (due - now).total_seconds())
+                self._wakeup.wait(max(0.0, wait))
                 
             except Exception as e:
-                print(f"Strategy engine error: {e}")
-                time.sleep(10)
+                event_log.error("engine_error", engine="strategy", error=str(e))
+                self._wakeup.wait(10)
     
     def get_pending_signals(self) -> List[Signal]:
         """Get and clear pending signals"""
-        signals = self.signals.copy()
-        self.signals.clear()
+        # Swap in a fresh list so signals published meanwhile are never dropped
+        signals, self.signals = self.signals, []
         return signals
\ No newline at end of file
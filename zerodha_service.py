@@ -3,24 +3,100 @@ import os
 import requests
 import pyotp
 from dotenv import load_dotenv
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-import time
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin, urlparse, parse_qs
+
+from event_log import event_log
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.options import Options
+    from selenium.common.exceptions import TimeoutException
+except ImportError:  # Browser login is only a fallback for the HTTP flow
+    webdriver = None
 
 load_dotenv()
 
+# Point at a local mock server to exercise the login flow offline
+KITE_LOGIN_URL = os.getenv('KITE_LOGIN_URL', 'https://kite.zerodha.com')
+# "http" (never launch a browser), "browser" (Selenium only) or "auto" (HTTP, then Selenium)
+KITE_LOGIN_METHOD = os.getenv('KITE_LOGIN_METHOD', 'auto')
+
+# Connection pool shared by every login session; cookies stay per session
+_login_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+
+def _login_session() -> requests.Session:
+    session = requests.Session()
+    session.mount('https://', _login_adapter)
+    session.mount('http://', _login_adapter)
+    session.headers['X-Kite-Version'] = '3'
+    return session
+
 class ZerodhaService:
-    def __init__(self, api_key: str, access_token: str = None):
+    def __init__(self, api_key: str, access_token: str = None, login_base_url: str = None):
         self.api_key = api_key
+        self.login_base_url = (login_base_url or KITE_LOGIN_URL).rstrip('/')
         self.kite = KiteConnect(api_key=api_key)
         if access_token:
             self.kite.set_access_token(access_token)
     
     def login_with_credentials(self, user_id: str, password: str, totp_secret: str = None):
         """Login to Zerodha using credentials and OTP"""
+        if KITE_LOGIN_METHOD != 'browser' and totp_secret:
+            result = self.login_with_http(user_id, password, totp_secret)
+            if result['success'] or KITE_LOGIN_METHOD == 'http' or webdriver is None:
+                return result
+            event_log.log("http_login_failed", level="WARNING", api_key=self.api_key, error=result.get('error'),
+                          fallback="browser")
+        return self.login_with_browser(user_id, password, totp_secret)
+    
+    def login_with_http(self, user_id: str, password: str, totp_secret: str, timeout: float = 10):
+        """Login with plain HTTP requests: credentials, TOTP, then read request_token from the redirects"""
+        # Not closed afterwards: closing a session would also close the shared adapter
+        session = _login_session()
+        try:
+            login_url = f"{self.login_base_url}/connect/login?api_key={self.api_key}&v=3"
+            # Visiting the connect URL ties this session to the app being authorised
+            session.get(login_url, timeout=timeout)
+            
+            response = session.post(f"{self.login_base_url}/api/login",
+                                    data={'user_id': user_id, 'password': password}, timeout=timeout)
+            payload = response.json()
+            if response.status_code != 200 or payload.get('status') != 'success':
+                return {"success": False, "error": payload.get('message', f"login returned {response.status_code}")}
+            
+            response = session.post(f"{self.login_base_url}/api/twofa", data={
+                'user_id': user_id,
+                'request_id': payload['data']['request_id'],
+                'twofa_value': pyotp.TOTP(totp_secret).now(),
+                'twofa_type': payload['data'].get('twofa_type', 'totp')
+            }, timeout=timeout)
+            payload = response.json()
+            if response.status_code != 200 or payload.get('status') != 'success':
+                return {"success": False, "error": payload.get('message', f"twofa returned {response.status_code}")}
+            
+            # Follow redirects by hand: the last hop is the app's redirect URL, which need not be reachable
+            url = login_url + "&skip_session=true"
+            for _ in range(10):
+                location = session.get(url, allow_redirects=False, timeout=timeout).headers.get('Location')
+                if not location:
+                    break
+                url = urljoin(url, location)
+                request_token = parse_qs(urlparse(url).query).get('request_token')
+                if request_token:
+                    return {"success": True, "request_token": request_token[0], "message": "Login successful"}
+            return {"success": False, "error": "request_token not found in login redirects"}
+        except (requests.RequestException, ValueError, KeyError) as e:
+            return {"success": False, "error": str(e)}
+    
+    def login_with_browser(self, user_id: str, password: str, totp_secret: str = None):
+        """Login by driving headless Chrome through the Kite login pages"""
+        if webdriver is None:
+            return {"success": False, "error": "Browser login requires selenium: pip install selenium"}
+        driver = None
         try:
             # Setup Chrome options for headless browsing
             chrome_options = Options()
@@ -48,15 +124,12 @@ class ZerodhaService:
             login_button = driver.find_element(By.CLASS_NAME, "button-orange")
             login_button.click()
             
-            # Wait for OTP page
-            time.sleep(3)
-            
             # Generate OTP if TOTP secret provided
             if totp_secret:
                 totp = pyotp.TOTP(totp_secret)
                 otp_code = totp.now()
                 
-                # Fill OTP
+                # Fill OTP as soon as the OTP page renders
                 otp_field = WebDriverWait(driver, 10).until(
                     EC.presence_of_element_located((By.ID, "totp"))
                 )
@@ -66,20 +139,21 @@ class ZerodhaService:
                 continue_button = driver.find_element(By.CLASS_NAME, "button-orange")
                 continue_button.click()
                 
-                # Wait for redirect and extract request token
-                time.sleep(5)
+                # Wait for the redirect back to the app and extract request token
+                try:
+                    WebDriverWait(driver, 15).until(EC.url_contains("request_token="))
+                except TimeoutException:
+                    pass
                 current_url = driver.current_url
                 
                 if "request_token=" in current_url:
                     request_token = current_url.split("request_token=")[1].split("&")[0]
-                    driver.quit()
                     return {
                         "success": True,
                         "request_token": request_token,
                         "message": "Login successful"
                     }
             
-            driver.quit()
             return {
                 "success": False,
                 "message": "OTP required or login failed",
@@ -91,6 +165,10 @@ class ZerodhaService:
                 "success": False,
                 "error": str(e)
             }
+        finally:
+            # Always release the browser, pooled refreshes would otherwise leak Chrome processes
+            if driver is not None:
+                driver.quit()
     
     def login_with_manual_otp(self, user_id: str, password: str):
         """Login and wait for manual OTP entry"""